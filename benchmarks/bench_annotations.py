@@ -0,0 +1,78 @@
+"""
+各注解单次调用额外开销(相对未装饰方法), 以及旧版多层包装(extended_ignore -> extended_classmethod -> _execute)的对比
+
+    python benchmarks/bench_annotations.py [calls]
+"""
+import functools
+import logging
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sp_tools.annotation import log, retry, timed, cache, circuit_breaker, profile
+
+
+def _legacy(func, ignore=False):
+    """
+    旧版包装方式: 每个注解3层调用(忽略判断 -> @classmethod参数判断 -> 注解逻辑)
+    """
+
+    def _execute(*args, **kwargs):
+        return func(*args, **kwargs)
+
+    def _classmethod(*args, **kwargs):
+        if len(args) >= 2 and type(args[1]) == args[0]:
+            args = args[1:]
+        return _execute(*args, **kwargs)
+
+    @functools.wraps(func)
+    def _ignore(*args, **kwargs):
+        if not ignore:
+            return _classmethod(*args, **kwargs)
+        return func(*args, **kwargs)
+
+    return _ignore
+
+
+def run(calls):
+    logger = logging.getLogger('bench_annotations')
+    logger.setLevel(logging.WARNING)
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    def plain(x):
+        return x
+
+    class Methods:
+        @log(log_=logger)
+        def logged(self, x):
+            return x
+
+    cases = {
+        'legacy_wrapper': _legacy(plain),
+        'legacy_wrapper_x2': _legacy(_legacy(plain)),
+        'ignore': log(ignore=True)(plain),
+        'log_disabled_level': log(log_=logger)(plain),
+        'log_sampled_out': log(log_=logger, level_=logging.WARNING, sample_rate=0)(plain),
+        'retry': retry(plain),
+        'log_retry': log(log_=logger)(retry(plain)),
+        'timed': timed(name='bench_annotations')(plain),
+        'cache_hit': cache(plain),
+        'circuit_breaker': circuit_breaker(plain),
+        'profile_disabled': profile(plain),
+        # 类中定义的方法多一层 @classmethod 参数判断
+        'log_disabled_level_method': Methods().logged,
+    }
+    base_ns = min(timeit.repeat(lambda: plain(1), number=calls, repeat=5)) / calls * 1e9
+    results = []
+    for name, fn in cases.items():
+        ns = min(timeit.repeat(lambda: fn(1), number=calls, repeat=5)) / calls * 1e9
+        results.append({'name': name, 'overhead_ns': round(ns - base_ns, 1)})
+    return results
+
+
+if __name__ == '__main__':
+    for result in run(int(sys.argv[1]) if len(sys.argv) > 1 else 200000):
+        print(result)
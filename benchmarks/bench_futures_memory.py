@@ -0,0 +1,42 @@
+"""
+进行中(排队或执行中)的 @parallel 任务每个 SimpleFuture 的内存占用
+
+    python benchmarks/bench_futures_memory.py [futures]
+"""
+import os
+import sys
+import threading
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sp_tools.annotation import parallel, wait_all, BoundedThreadPool
+
+
+def run(futures):
+    release = threading.Event()
+    pool = BoundedThreadPool(1, queue_size=futures + 1, name='bench-memory')
+
+    @parallel(pool=pool)
+    def task(i):
+        release.wait()
+        return i
+
+    # 预热: 创建工作线程等一次性开销不计入
+    release.set()
+    task(0).get()
+    release.clear()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    outstanding = [task(i) for i in range(futures)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    release.set()
+    wait_all(outstanding)
+    pool.shutdown()
+    return [{'name': 'outstanding_future', 'futures': futures, 'bytes_per_future': round((after - before) / futures)}]
+
+
+if __name__ == '__main__':
+    for result in run(int(sys.argv[1]) if len(sys.argv) > 1 else 10000):
+        print(result)
@@ -0,0 +1,55 @@
+"""
+包导入耗时(基于 python -X importtime, 每次在新的解释器进程中导入, 取多次运行的最小值)
+
+    python benchmarks/bench_import.py [repeat]
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 用例名称 -> 导入语句
+CASES = {
+    'sp_tools': 'import sp_tools',
+    'sp_tools.logger': 'import sp_tools.logger',
+    'from_sp_tools_import_retry': 'from sp_tools import retry',
+    'sp_tools.annotation': 'import sp_tools.annotation',
+    'sp_tools.pipeline': 'import sp_tools.pipeline',
+    'star_import': 'from sp_tools import *',
+}
+
+
+def _import_us(statement):
+    """
+    返回执行导入语句的进程中所有顶层导入的累计耗时(单位: us)及导入的模块数(含解释器启动时的导入)
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], env=env, capture_output=True,
+                            text=True, check=True).stderr
+    total = modules = 0
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules += 1
+        # 顶层导入(无缩进)的累计耗时之和即该语句的总导入耗时
+        if not name[1:].startswith(' '):
+            total += int(cumulative)
+    return total, modules
+
+
+def run(repeat):
+    # 扣除解释器启动时的导入(site等)
+    base_us, base_modules = min(_import_us('pass') for _ in range(repeat))
+    results = []
+    for name, statement in CASES.items():
+        samples = [_import_us(statement) for _ in range(repeat)]
+        results.append({'name': name, 'import_us': min(s[0] for s in samples) - base_us,
+                        'modules': samples[0][1] - base_modules})
+    return results
+
+
+if __name__ == '__main__':
+    for result in run(int(sys.argv[1]) if len(sys.argv) > 1 else 10):
+        print(result)
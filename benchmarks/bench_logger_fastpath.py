@@ -0,0 +1,36 @@
+"""
+延迟初始化日志对象单次调用开销对比(初始化后直接绑定 vs 经过延迟初始化包装)
+
+    python benchmarks/bench_logger_fastpath.py [calls]
+"""
+import logging
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sp_tools.logger import new_logger
+
+
+def run(calls):
+    logger = new_logger('bench_fastpath', {'logging': {'level': 'INFO', 'streamHandler': {'open': 'False'}}})
+    logger.addHandler(logging.NullHandler())
+    wrapped = type(logger)
+    cases = {
+        'enabled_info': (lambda: wrapped.info(logger, 'message %s', 1), lambda: logger.info('message %s', 1)),
+        'disabled_debug': (lambda: wrapped.debug(logger, 'message %s', 1), lambda: logger.debug('message %s', 1)),
+        'isEnabledFor': (lambda: wrapped.isEnabledFor(logger, logging.DEBUG),
+                         lambda: logger.isEnabledFor(logging.DEBUG)),
+    }
+    results = []
+    for name, (before, after) in cases.items():
+        before_ns = min(timeit.repeat(before, number=calls, repeat=5)) / calls * 1e9
+        after_ns = min(timeit.repeat(after, number=calls, repeat=5)) / calls * 1e9
+        results.append({'name': name, 'wrapped_ns': round(before_ns, 1), 'direct_ns': round(after_ns, 1)})
+    return results
+
+
+if __name__ == '__main__':
+    for result in run(int(sys.argv[1]) if len(sys.argv) > 1 else 200000):
+        print(result)
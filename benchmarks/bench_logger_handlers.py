@@ -0,0 +1,70 @@
+"""
+各文件类handler(同步写入及异步队列批量写入)的日志吞吐量及调用延迟对比
+
+    python benchmarks/bench_logger_handlers.py [records]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sp_tools.logger import new_logger
+
+# 用例名称 -> handler配置(与 init_config 支持的 handler 类型一致)
+HANDLERS = {
+    'file': ('fileHandler', {}),
+    'rotating_file': ('rotatingFileHandler', {'maxBytes': str(8 * 1024 * 1024), 'backupCount': '2'}),
+    'timed_rotating_file': ('timedRotatingFileHandler', {'when': 'h'}),
+}
+
+
+def _properties(handler, options, filename, queue_open):
+    return {
+        'logging': {
+            'streamHandler': {'open': 'False'},
+            handler: dict(options, open='True', filename=filename),
+            'queueHandler': {'open': str(queue_open)},
+        }
+    }
+
+
+def run_case(name, handler, options, queue_open, records):
+    with tempfile.TemporaryDirectory() as tmp:
+        logger = new_logger(name, _properties(handler, options, os.path.join(tmp, name + '.log'), queue_open))
+        logger.info('warm up')
+        latencies = []
+        begin = time.perf_counter()
+        for i in range(records):
+            t = time.perf_counter_ns()
+            logger.info('record %d payload %s', i, 'x' * 64)
+            latencies.append(time.perf_counter_ns() - t)
+        call_cost = time.perf_counter() - begin
+        for h in list(logger.handlers_()):
+            h.close()
+            logger.removeHandler(h)
+        total_cost = time.perf_counter() - begin
+    latencies.sort()
+    return {
+        'name': name,
+        'records': records,
+        'caller_records_per_s': round(records / call_cost),
+        'drained_records_per_s': round(records / total_cost),
+        'p50_us': latencies[len(latencies) // 2] / 1000,
+        'p99_us': latencies[int(len(latencies) * 0.99)] / 1000,
+    }
+
+
+def run(records):
+    results = []
+    for name, (handler, options) in HANDLERS.items():
+        for queue_open in (False, True):
+            case = ('queue_' if queue_open else 'sync_') + name
+            results.append(run_case(case, handler, options, queue_open, records))
+    return results
+
+
+if __name__ == '__main__':
+    for result in run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000):
+        print(result)
@@ -0,0 +1,76 @@
+"""
+@parallel 线程池扇出/扇入吞吐量随工作线程数的变化, 以及 SimpleFuture.get() 延迟
+
+    python benchmarks/bench_parallel.py [tasks]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sp_tools.annotation import parallel, wait_all, BoundedThreadPool
+
+WORKERS = (1, 2, 4, 8, 16)
+
+
+def _fan_out(workers, tasks, sleep):
+    pool = BoundedThreadPool(workers, name=f'bench-{workers}')
+
+    @parallel(pool=pool)
+    def task(i):
+        if sleep:
+            time.sleep(sleep)
+        return i
+
+    wait_all([task(i) for i in range(workers)])
+    begin = time.perf_counter()
+    wait_all([task(i) for i in range(tasks)])
+    cost = time.perf_counter() - begin
+    pool.shutdown()
+    return round(tasks / cost)
+
+
+def _get_latency(calls):
+    pool = BoundedThreadPool(1, name='bench-get')
+
+    @parallel(pool=pool)
+    def task():
+        return 1
+
+    done = task()
+    done.get()
+    begin = time.perf_counter_ns()
+    for _ in range(calls):
+        done.get()
+    done_ns = (time.perf_counter_ns() - begin) / calls
+    latencies = []
+    for _ in range(calls // 10):
+        t = time.perf_counter_ns()
+        task().get()
+        latencies.append(time.perf_counter_ns() - t)
+    pool.shutdown()
+    latencies.sort()
+    return {
+        'name': 'simple_future_get',
+        'done_get_ns': round(done_ns, 1),
+        'round_trip_p50_us': latencies[len(latencies) // 2] / 1000,
+        'round_trip_p99_us': latencies[int(len(latencies) * 0.99)] / 1000,
+    }
+
+
+def run(tasks):
+    results = []
+    for name, sleep in (('fan_out_noop', 0), ('fan_out_sleep_1ms', 0.001)):
+        # 含 sleep 的任务数按比例减少, 控制单次运行时间
+        n = tasks if not sleep else max(100, tasks // 20)
+        for workers in WORKERS:
+            results.append({'name': name, 'workers': workers, 'tasks': n,
+                            'tasks_per_s': _fan_out(workers, n, sleep)})
+    results.append(_get_latency(tasks))
+    return results
+
+
+if __name__ == '__main__':
+    for result in run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000):
+        print(result)
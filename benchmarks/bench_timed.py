@@ -0,0 +1,38 @@
+"""
+@timed 单次调用额外开销(对比未装饰方法及仅读取两次 perf_counter_ns 的下限)
+开销与机器及 Python 版本相关, 以目标机器上的测量结果为准
+
+    python benchmarks/bench_timed.py [calls]
+"""
+import os
+import sys
+import timeit
+from time import perf_counter_ns
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sp_tools.annotation import timed
+
+
+def run(calls):
+    def plain(x):
+        return x
+
+    def clock_only(x):
+        start = perf_counter_ns()
+        result = plain(x)
+        perf_counter_ns() - start
+        return result
+
+    decorated = timed(name='bench_timed')(plain)
+    base_ns = min(timeit.repeat(lambda: plain(1), number=calls, repeat=5)) / calls * 1e9
+    results = []
+    for name, fn in (('clock_only', clock_only), ('timed', decorated)):
+        ns = min(timeit.repeat(lambda: fn(1), number=calls, repeat=5)) / calls * 1e9
+        results.append({'name': name, 'overhead_ns': round(ns - base_ns, 1)})
+    return results
+
+
+if __name__ == '__main__':
+    for result in run(int(sys.argv[1]) if len(sys.argv) > 1 else 200000):
+        print(result)
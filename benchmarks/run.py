@@ -0,0 +1,125 @@
+"""
+运行全部(或指定)对比测试, 以JSON输出结果及运行环境, 便于不同版本/机器间对比:
+
+    python benchmarks/run.py [--quick] [--only annotations,parallel] [--output result.json] [--compare baseline.json]
+
+--compare 指定历史结果文件时, 额外输出各数值指标相对历史结果的比值(当前值/历史值)
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import bench_annotations
+import bench_futures_memory
+import bench_import
+import bench_logger_fastpath
+import bench_logger_handlers
+import bench_parallel
+import bench_timed
+
+# 名称 -> (运行方法, 默认规模, 快速模式规模)
+SUITES = {
+    'annotations': (bench_annotations.run, 200000, 20000),
+    'timed': (bench_timed.run, 200000, 20000),
+    'logger_fastpath': (bench_logger_fastpath.run, 200000, 20000),
+    'logger_handlers': (bench_logger_handlers.run, 100000, 5000),
+    'parallel': (bench_parallel.run, 20000, 2000),
+    'futures_memory': (bench_futures_memory.run, 10000, 1000),
+    'import_time': (bench_import.run, 10, 3),
+}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _meta(quick):
+    return {
+        'timestamp': datetime.datetime.now().astimezone().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'git_commit': _git_commit(),
+        'quick': quick,
+    }
+
+
+# 标识一条结果的字段, 及不参与对比的规模字段
+KEY_FIELDS = ('name', 'workers')
+SIZE_FIELDS = ('records', 'tasks', 'futures')
+
+
+def _key(result):
+    return tuple((k, result[k]) for k in KEY_FIELDS if k in result)
+
+
+def compare(current, baseline):
+    """
+    逐条对比数值指标, 返回 {套件名: [{标识字段..., 指标: 当前值/历史值}]}, 历史结果中不存在的条目不输出
+    """
+    ratios = {}
+    for suite, data in current['suites'].items():
+        previous = {_key(r): r for r in baseline.get('suites', {}).get(suite, {}).get('results', [])}
+        rows = []
+        for result in data['results']:
+            old = previous.get(_key(result))
+            if old is None:
+                continue
+            row = dict(_key(result))
+            for k, v in result.items():
+                if k in row or k in SIZE_FIELDS or not isinstance(v, (int, float)) or isinstance(v, bool):
+                    continue
+                if isinstance(old.get(k), (int, float)) and old[k]:
+                    row[k] = round(v / old[k], 3)
+            rows.append(row)
+        if rows:
+            ratios[suite] = rows
+    return ratios
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='sp_tools benchmarks')
+    parser.add_argument('--quick', action='store_true', help='以较小规模运行(结果波动较大)')
+    parser.add_argument('--only', default='', help='仅运行指定套件, 逗号分隔: ' + ','.join(SUITES))
+    parser.add_argument('--output', help='结果写入文件(默认输出至标准输出)')
+    parser.add_argument('--compare', help='历史结果文件')
+    args = parser.parse_args(argv)
+    names = [n for n in args.only.split(',') if n] or list(SUITES)
+    unknown = [n for n in names if n not in SUITES]
+    if unknown:
+        parser.error('unknown suite: ' + ','.join(unknown))
+    report = {'meta': _meta(args.quick), 'suites': {}}
+    for name in names:
+        run, size, quick_size = SUITES[name]
+        size = quick_size if args.quick else size
+        begin = time.perf_counter()
+        results = run(size)
+        report['suites'][name] = {'size': size, 'seconds': round(time.perf_counter() - begin, 3), 'results': results}
+        print(f'[{name}] done in {report["suites"][name]["seconds"]}s', file=sys.stderr)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            report['compare'] = compare(report, json.load(f))
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
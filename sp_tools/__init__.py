@@ -1,2 +1,37 @@
-from .annotation import *
-from .logger import *
+import importlib
+
+# 导出名称 -> 所在子包, 首次访问时才导入对应子包(import sp_tools 本身不加载任何子包)
+_EXPORTS = {
+    '.annotation': (
+        'retry', 'parallel', 'extended_annotation', 'log', 'SimpleFuture', 'wait_all', 'wait_any', 'as_completed',
+        'RetryBudget', 'get_retry_stats', 'get_pool', 'get_pool_metrics', 'BoundedThreadPool', 'PoolRejectedError',
+        'get_process_pool', 'circuit_breaker', 'CircuitBreaker', 'CircuitOpenError', 'cache', 'LRUCache', 'batch',
+        'Batcher', 'hedge', 'LatencyTracker', 'timed', 'get_timer', 'get_timed_stats', 'start_timed_report',
+        'stop_timed_report', 'profile', 'configure_profile', 'get_profile_stats', 'reset_profile_stats',
+        'format_profile_report', 'timeout', 'CancellationToken', 'current_token', 'CallTimeoutError', 'Log', 'Retry',
+        'Async', 'Annotation',
+    ),
+    '.logger': ('get_logger', 'new_logger', 'dump_flight_recorder'),
+    '.pipeline': ('Pipeline', 'Stage', 'stage'),
+}
+# 可通过属性访问的子包(autosyspath 导入即修改 sys.path, 需显式导入)
+_SUBPACKAGES = ('annotation', 'logger', 'pipeline')
+_LOCATIONS = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = list(_LOCATIONS)
+
+
+def __getattr__(name):
+    if name in _SUBPACKAGES:
+        return importlib.import_module('.' + name, __name__)
+    module = _LOCATIONS.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(module, __name__), name)
+    # 缓存至模块属性, 之后的访问不再经过 __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
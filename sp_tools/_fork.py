@@ -0,0 +1,65 @@
+"""
+fork 处理: 统一注册 fork 前及 fork 出的子进程中执行的回调.
+fork 出的子进程中只有调用 fork 的线程, 父进程中其他线程持有的锁在子进程中不会被释放, 后台线程及工作线程也不存在,
+需要在子进程中重新创建锁并按需重新启动线程
+"""
+import os
+import sys
+import weakref
+
+_before = []
+_after_in_child = []
+_instances = weakref.WeakSet()
+
+
+def before_fork(callback):
+    """
+    注册 fork 前在调用 fork 的线程中执行的回调, 可作为装饰器使用
+    """
+    _before.append(callback)
+    return callback
+
+
+def after_fork_in_child(callback):
+    """
+    注册在 fork 出的子进程中执行的回调(重置模块级的锁及后台线程), 可作为装饰器使用
+    """
+    _after_in_child.append(callback)
+    return callback
+
+
+def register_instance(obj):
+    """
+    注册实例(弱引用): fork 前调用其 _before_fork 方法(如有), fork 出的子进程中调用其 _after_fork 方法.
+    子进程中先执行 after_fork_in_child 注册的回调, 再重置实例
+    """
+    _instances.add(obj)
+    return obj
+
+
+def _call(callback):
+    try:
+        callback()
+    except Exception:
+        # 同 os.register_at_fork: 回调出错不影响其他回调及 fork 本身
+        sys.excepthook(*sys.exc_info())
+
+
+def _run_before():
+    for callback in list(_before):
+        _call(callback)
+    for obj in list(_instances):
+        callback = getattr(obj, '_before_fork', None)
+        if callback is not None:
+            _call(callback)
+
+
+def _run_after_in_child():
+    for callback in list(_after_in_child):
+        _call(callback)
+    for obj in list(_instances):
+        _call(obj._after_fork)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(before=_run_before, after_in_child=_run_after_in_child)
@@ -1,4 +1,16 @@
 from .common import retry, parallel, annotation, extended_annotation, log
+from .common import SimpleFuture, wait_all, wait_any, as_completed
+from .backoff import RetryBudget, get_retry_stats
+from .pool import get_pool, get_pool_metrics, BoundedThreadPool, PoolRejectedError
+from .process import get_process_pool
+from .circuit import circuit_breaker, CircuitBreaker, CircuitOpenError
+from ._cache import cache, LRUCache
+from ._batch import batch, Batcher
+from ._hedge import hedge, LatencyTracker
+from ._timed import timed, get_timer, get_timed_stats, start_timed_report, stop_timed_report
+from .cancel import CancellationToken, current_token, CallTimeoutError
+from ._timeout import timeout
+from ._profile import profile, configure_profile, get_profile_stats, reset_profile_stats, format_profile_report
 
 # 提供类似Java注解
 Log = log
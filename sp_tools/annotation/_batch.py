@@ -0,0 +1,181 @@
+import functools
+import inspect
+import threading
+import time
+from concurrent.futures import Executor, Future
+
+from .._fork import register_instance
+from .common import annotation, extended_annotation, extended_classmethod, SimpleFuture
+from .pool import get_pool
+
+# 默认执行到期批次的线程池
+BATCH_POOL = 'batch'
+
+
+class _Batch:
+    __slots__ = ('deadline', 'leading', 'kwargs', 'items', 'futures')
+
+    def __init__(self, deadline, leading, kwargs):
+        self.deadline = deadline
+        self.leading = leading
+        self.kwargs = kwargs
+        self.items = []
+        self.futures = []
+
+
+class Batcher:
+    """
+    批量合并器: 收集单条调用, 按 (前置参数, 关键字参数) 分组, 每组达到 max_size 条时由凑满该批的调用线程执行批量方法,
+    否则在第一条进入后 max_wait 秒由后台线程提交至线程池执行批量方法(多个到期批次并行执行), 每条调用的额外等待时间不超过 max_wait
+    """
+
+    def __init__(self, func, max_size=100, max_wait=0.01, name=None, pool=None):
+        """
+        :param func: 批量方法 func(*leading, items, **kwargs) -> 与 items 等长且顺序一致的结果序列
+        :param max_size: 每批最大条数
+        :param max_wait: 每批最长等待时间, 单位: s
+        :param name: 名称(后台线程名)
+        :param pool: 执行到期批次的线程池, 支持 concurrent.futures.Executor 对象或命名线程池名称(见 get_pool),
+                     若不传该值使用进程内共享的 batch 线程池
+        """
+        self.func = func
+        self.max_size = max(1, max_size)
+        self.max_wait = max_wait
+        self.name = name or getattr(func, '__qualname__', 'batch')
+        self.pool = pool
+        self.__pending = {}
+        self.__condition = threading.Condition(threading.Lock())
+        self.__thread = None
+        self.__counters = {'calls': 0, 'batches': 0, 'full_batches': 0, 'timeout_batches': 0, 'max_batch_size': 0}
+        register_instance(self)
+
+    def submit(self, leading, item, kwargs) -> Future:
+        """
+        提交单条调用, 返回承载该条结果的 Future
+        """
+        key = (leading, tuple(sorted(kwargs.items()))) if kwargs else leading
+        future = Future()
+        full = None
+        with self.__condition:
+            pending = self.__pending
+            batch = pending.get(key)
+            if batch is None:
+                batch = pending[key] = _Batch(time.monotonic() + self.max_wait, leading, kwargs)
+                if len(pending) == 1:
+                    self.__ensure_thread()
+                    self.__condition.notify()
+            batch.items.append(item)
+            batch.futures.append(future)
+            self.__counters['calls'] += 1
+            if len(batch.items) >= self.max_size:
+                del pending[key]
+                full = batch
+                self.__counters['full_batches'] += 1
+        if full is not None:
+            self.__run(full)
+        return future
+
+    def stats(self) -> dict:
+        """
+        批量统计: calls: 单条调用数, batches: 批量方法调用次数, full_batches/timeout_batches: 因凑满/超时执行的批次数,
+        max_batch_size: 最大批次条数, pending: 等待中的条数
+        """
+        with self.__condition:
+            stats = dict(self.__counters)
+            stats['pending'] = sum(len(batch.items) for batch in self.__pending.values())
+        return stats
+
+    def _after_fork(self):
+        """
+        fork 出的子进程中后台线程已不存在, 父进程等待中的条目由父进程执行, 子进程中丢弃
+        """
+        self.__pending = {}
+        self.__condition = threading.Condition(threading.Lock())
+        self.__thread = None
+
+    def __ensure_thread(self):
+        if self.__thread is None:
+            self.__thread = threading.Thread(target=self.__flush, name=f'sp_tools-batch-{self.name}', daemon=True)
+            self.__thread.start()
+
+    def __flush(self):
+        condition = self.__condition
+        pending = self.__pending
+        while True:
+            with condition:
+                while not pending:
+                    condition.wait()
+                # 分组按进入顺序排列, 第一组即最早到期
+                key, batch = next(iter(pending.items()))
+                delay = batch.deadline - time.monotonic()
+                if delay > 0:
+                    condition.wait(delay)
+                    continue
+                del pending[key]
+                self.__counters['timeout_batches'] += 1
+            pool = self.pool if isinstance(self.pool, Executor) else get_pool(self.pool or BATCH_POOL)
+            try:
+                pool.submit(self.__run, batch)
+            except Exception:
+                # 线程池已关闭或拒绝时在后台线程中直接执行
+                self.__run(batch)
+
+    def __run(self, batch):
+        futures = batch.futures
+        with self.__condition:
+            self.__counters['batches'] += 1
+            self.__counters['max_batch_size'] = max(self.__counters['max_batch_size'], len(futures))
+        try:
+            results = list(self.func(*batch.leading, batch.items, **batch.kwargs))
+            if len(results) != len(futures):
+                raise ValueError(f'batch function {self.name} returned {len(results)} results '
+                                 f'for {len(futures)} items')
+        except BaseException as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future, result in zip(futures, results):
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+@annotation
+@extended_annotation
+def batch(ignore=False, max_size=100, max_wait_ms=10, pool=None):
+    """
+    批量合并注解, 将多个线程的单条调用合并为一次批量调用, 使用方式:
+        @batch(max_size=100, max_wait_ms=10)
+        def fetch(ids):
+            return [query(i) for i in ids]
+
+        fetch(1)  # 单条调用, 阻塞至所在批次完成后返回该条结果
+    被装饰方法的最后一个位置参数为条目列表, 返回与之等长且顺序一致的结果序列, 结果为异常对象时该条调用抛出该异常;
+    单条调用时最后一个位置参数为单个条目, 其余参数相同的调用合并为一批(如同一对象的方法调用)
+    :param ignore: 是否忽略该注解(忽略时每条调用单独调用批量方法)
+    :param max_size: 每批最大条数, 凑满时由凑满该批的调用线程立即执行
+    :param max_wait_ms: 每批最长等待时间, 单位: ms, 未凑满时到期后提交至线程池执行
+    :param pool: 执行到期批次的线程池, 支持 concurrent.futures.Executor 对象或命名线程池名称(见 get_pool),
+                 若不传该值使用进程内共享的 batch 线程池
+    :return 装饰后的方法新增 submit(*args, **kwargs) 提交单条调用并返回 SimpleFuture, batch_stats() 获取批量统计
+    """
+
+    def wrapper(func):
+        if inspect.iscoroutinefunction(func):
+            # 单条调用阻塞等待所在批次完成, 不适用于协程
+            raise ValueError(f'@batch does not support coroutine function: {func.__qualname__}')
+        batcher = Batcher(func, 1 if ignore else max_size, max_wait_ms / 1000, pool=pool)
+
+        @functools.wraps(func)
+        def _execute(*args, **kwargs):
+            return batcher.submit(args[:-1], args[-1], kwargs).result()
+
+        def submit(*args, **kwargs) -> SimpleFuture:
+            return SimpleFuture(future=batcher.submit(args[:-1], args[-1], kwargs))
+
+        _execute.submit = submit
+        _execute.batch_stats = batcher.stats
+        return extended_classmethod(_execute)
+
+    return wrapper
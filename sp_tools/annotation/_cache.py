@@ -0,0 +1,221 @@
+import functools
+import inspect
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from .common import annotation, extended_annotation, extended_classmethod
+
+_MISSING = object()
+_KWARGS_MARK = object()
+
+
+def _make_key(args, kwargs):
+    if not kwargs:
+        return args[0] if len(args) == 1 and type(args[0]) in (int, str) else args
+    return args + (_KWARGS_MARK,) + tuple(kwargs.items())
+
+
+class LRUCache:
+    """
+    线程安全的LRU缓存, 支持条目数上限、条目过期时间及内存占用上限, 超出上限时淘汰最久未访问的条目
+    """
+
+    def __init__(self, max_size=128, ttl=None, max_memory=None, sizeof=sys.getsizeof):
+        """
+        :param max_size: 最大条目数, None 表示不限制
+        :param ttl: 条目过期时间, 单位: s, None 表示不过期
+        :param max_memory: 所有条目的内存占用上限, 单位: byte, None 表示不限制
+        :param sizeof: 计算条目内存占用的方法, 默认 sys.getsizeof(仅计算对象本身, 不含引用的对象)
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_memory = max_memory
+        self.sizeof = sizeof
+        self.__data = OrderedDict()
+        self.__memory = 0
+        self.__lock = threading.Lock()
+        self.__counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+    def get(self, key, default=_MISSING):
+        return self._lookup(key, default, True)
+
+    def _lookup(self, key, default, record):
+        counters = self.__counters
+        with self.__lock:
+            entry = self.__data.get(key)
+            if entry is None:
+                if record:
+                    counters['misses'] += 1
+                return default
+            value, expires_at, size = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self.__data[key]
+                self.__memory -= size
+                counters['expirations'] += 1
+                if record:
+                    counters['misses'] += 1
+                return default
+            self.__data.move_to_end(key)
+            if record:
+                counters['hits'] += 1
+            return value
+
+    def put(self, key, value):
+        size = self.sizeof(value) if self.max_memory is not None else 0
+        if self.max_memory is not None and size > self.max_memory:
+            # 单个条目超出内存上限时不缓存
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self.__lock:
+            previous = self.__data.pop(key, None)
+            if previous is not None:
+                self.__memory -= previous[2]
+            self.__data[key] = (value, expires_at, size)
+            self.__memory += size
+            while (self.max_size is not None and len(self.__data) > self.max_size) or \
+                    (self.max_memory is not None and self.__memory > self.max_memory):
+                _, (_, _, evicted_size) = self.__data.popitem(last=False)
+                self.__memory -= evicted_size
+                self.__counters['evictions'] += 1
+
+    def clear(self):
+        with self.__lock:
+            self.__data.clear()
+            self.__memory = 0
+
+    def info(self) -> dict:
+        """
+        缓存统计: hits/misses: 命中/未命中次数, evictions: 因超出上限被淘汰的条目数, expirations: 过期删除的条目数,
+        size: 当前条目数, memory: 当前内存占用(未设置 max_memory 时为0)
+        """
+        with self.__lock:
+            info = dict(self.__counters)
+            info.update(size=len(self.__data), memory=self.__memory, max_size=self.max_size,
+                        max_memory=self.max_memory, ttl=self.ttl)
+        return info
+
+    def __len__(self):
+        return len(self.__data)
+
+
+@annotation
+@extended_annotation
+def cache(ignore=False, max_size=128, ttl=None, max_memory=None, sizeof=sys.getsizeof, key=None,
+          single_flight=True):
+    """
+    缓存注解, 相同参数的调用直接返回缓存结果(异常不缓存), 使用方式:
+        @cache
+        def f(x):
+            pass
+    :param ignore: 是否忽略该注解
+    :param max_size: 最大缓存条目数, None 表示不限制
+    :param ttl: 缓存过期时间, 单位: s, None 表示不过期
+    :param max_memory: 缓存结果的内存占用上限, 单位: byte, None 表示不限制
+    :param sizeof: 计算缓存结果内存占用的方法, 默认 sys.getsizeof(仅计算对象本身, 不含引用的对象)
+    :param key: 缓存键方法 key(*args, **kwargs), 为None时以全部参数作为缓存键(参数需可hash)
+    :param single_flight: 是否合并并发调用, 开启时相同缓存键的并发未命中调用只执行一次方法, 其余调用等待并共享其结果
+    :return 装饰后的方法新增 cache_info() 获取缓存统计, cache_clear() 清空缓存
+    """
+
+    def wrapper(func):
+        if ignore:
+            return func
+        store = LRUCache(max_size, ttl, max_memory, sizeof)
+        inflight = {}
+        lock = threading.Lock()
+        counters = {'single_flight_waits': 0}
+
+        def _key(args, kwargs):
+            return _make_key(args, kwargs) if key is None else key(*args, **kwargs)
+
+        def _join(k):
+            """
+            返回 (缓存结果, 正在执行的 Future, 是否需由当前调用执行)
+            """
+            with lock:
+                future = inflight.get(k)
+                if future is not None:
+                    counters['single_flight_waits'] += 1
+                    return _MISSING, future, False
+                # 加锁后再次检查, 避免上一次执行恰好在此之前完成而重复执行
+                value = store._lookup(k, _MISSING, False)
+                if value is not _MISSING:
+                    return value, None, False
+                future = inflight[k] = Future()
+                return _MISSING, future, True
+
+        if inspect.iscoroutinefunction(func):
+            import asyncio
+
+            def _complete(inflight_key, k, task):
+                with lock:
+                    inflight.pop(inflight_key, None)
+                if not task.cancelled() and task.exception() is None:
+                    store.put(k, task.result())
+
+            @functools.wraps(func)
+            async def _async_execute(*args, **kwargs):
+                k = _key(args, kwargs)
+                value = store.get(k)
+                if value is not _MISSING:
+                    return value
+                if not single_flight:
+                    value = await func(*args, **kwargs)
+                    store.put(k, value)
+                    return value
+                # 同一事件循环内的并发调用共享同一个Task, 调用方被取消时不影响该Task
+                loop = asyncio.get_running_loop()
+                inflight_key = (loop, k)
+                with lock:
+                    task = inflight.get(inflight_key)
+                    if task is None:
+                        task = loop.create_task(func(*args, **kwargs))
+                        inflight[inflight_key] = task
+                        task.add_done_callback(functools.partial(_complete, inflight_key, k))
+                    else:
+                        counters['single_flight_waits'] += 1
+                return await asyncio.shield(task)
+
+            _execute = _async_execute
+        else:
+            @functools.wraps(func)
+            def _execute(*args, **kwargs):
+                k = _key(args, kwargs)
+                value = store.get(k)
+                if value is not _MISSING:
+                    return value
+                if not single_flight:
+                    value = func(*args, **kwargs)
+                    store.put(k, value)
+                    return value
+                value, future, leader = _join(k)
+                if value is not _MISSING:
+                    return value
+                if not leader:
+                    return future.result()
+                try:
+                    value = func(*args, **kwargs)
+                except BaseException as e:
+                    future.set_exception(e)
+                    raise e
+                else:
+                    store.put(k, value)
+                    future.set_result(value)
+                    return value
+                finally:
+                    with lock:
+                        inflight.pop(k, None)
+
+        def cache_info() -> dict:
+            info = store.info()
+            info.update(counters)
+            return info
+
+        _execute.cache_info = cache_info
+        _execute.cache_clear = store.clear
+        return extended_classmethod(_execute)
+
+    return wrapper
@@ -0,0 +1,147 @@
+import functools
+import inspect
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, wait, FIRST_COMPLETED
+
+from .backoff import RetryBudget
+from .common import annotation, extended_annotation, extended_classmethod
+from .pool import get_pool
+
+# 默认执行调用的线程池, 与 @parallel 默认线程池分开, 避免在 @parallel 任务中调用时与外层任务争用工作线程
+HEDGE_POOL = 'hedge'
+
+
+class LatencyTracker:
+    """
+    最近 window 次调用的耗时统计, 分位数每 refresh 次记录重新计算一次, 读取分位数无需排序
+    """
+
+    def __init__(self, window=1000, percentile=95, refresh=32):
+        """
+        :param window: 统计的最近调用次数
+        :param percentile: 计算的分位数(0~100)
+        :param refresh: 每记录该次数后重新计算分位数
+        """
+        self.percentile = percentile
+        self.refresh = refresh
+        self.__samples = deque(maxlen=window)
+        self.__count = 0
+        self.__value = None
+        self.__lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.__lock:
+            self.__samples.append(seconds)
+            self.__count += 1
+            if self.__count % self.refresh == 0:
+                self.__value = self.__quantile(self.percentile)
+
+    def value(self, min_samples=0):
+        """
+        当前分位数耗时, 单位: s, 样本数不足 min_samples 时返回None
+        """
+        if len(self.__samples) < max(1, min_samples):
+            return None
+        if self.__value is None:
+            with self.__lock:
+                self.__value = self.__quantile(self.percentile)
+        return self.__value
+
+    def snapshot(self) -> dict:
+        with self.__lock:
+            return {'samples': len(self.__samples), 'p50': self.__quantile(50), 'p95': self.__quantile(95),
+                    'p99': self.__quantile(99)}
+
+    def __quantile(self, percentile):
+        samples = sorted(self.__samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * percentile / 100))]
+
+
+@annotation
+@extended_annotation
+def hedge(ignore=False, delay_ms=None, percentile=95, min_samples=20, max_extra_ratio=0.1, pool=None,
+          window=1000):
+    """
+    对冲请求注解, 调用在 delay_ms(未设置时为该方法最近调用耗时的 percentile 分位数)内未完成时, 再发起一次相同调用,
+    返回先成功完成的结果, 另一次调用若仍在排队则取消, 否则忽略其结果, 用于降低长尾耗时. 仅适用于幂等方法, 使用方式:
+        @hedge
+        def f():
+            pass
+    :param ignore: 是否忽略该注解
+    :param delay_ms: 发起对冲调用的等待时间, 单位: ms, 为None时按最近调用耗时的分位数自动计算
+    :param percentile: 自动计算等待时间的分位数(0~100)
+    :param min_samples: 自动计算等待时间时, 样本数达到该值后才发起对冲调用
+    :param max_extra_ratio: 对冲调用数占调用数的比例上限, 限制对冲带来的额外负载
+    :param pool: 执行的线程池, 支持 concurrent.futures.Executor 对象或命名线程池名称(见 get_pool),
+                 若不传该值使用进程内共享的 hedge 线程池
+    :param window: 耗时统计的最近调用次数
+    :return 装饰后的方法新增 hedge_stats() 获取耗时分位数及对冲计数
+    """
+
+    def wrapper(func):
+        if ignore:
+            return func
+        if inspect.iscoroutinefunction(func):
+            # 对冲调用在线程池中执行, 协程方法只会返回协程对象
+            raise ValueError(f'@hedge does not support coroutine function: {func.__qualname__}')
+        tracker = LatencyTracker(window, percentile)
+        budget = RetryBudget(ratio=max_extra_ratio, min_per_second=0)
+        counters = {'calls': 0, 'hedges': 0, 'hedge_wins': 0, 'budget_rejections': 0}
+        lock = threading.Lock()
+
+        def _increase(field):
+            with lock:
+                counters[field] += 1
+
+        def _record(start, future):
+            # 仅统计成功完成的调用耗时(含排队时间)
+            if not future.cancelled() and future.exception() is None:
+                tracker.record(time.perf_counter() - start)
+
+        def _submit(executor, args, kwargs):
+            future = executor.submit(func, *args, **kwargs)
+            future.add_done_callback(functools.partial(_record, time.perf_counter()))
+            return future
+
+        @functools.wraps(func)
+        def _execute(*args, **kwargs):
+            executor = pool if isinstance(pool, Executor) else get_pool(pool or HEDGE_POOL)
+            _increase('calls')
+            budget.deposit()
+            primary = _submit(executor, args, kwargs)
+            delay = delay_ms / 1000 if delay_ms is not None else tracker.value(min_samples)
+            if delay is None or wait((primary,), timeout=delay).done:
+                return primary.result()
+            if not budget.try_withdraw():
+                _increase('budget_rejections')
+                return primary.result()
+            _increase('hedges')
+            pending = {primary, _submit(executor, args, kwargs)}
+            error = None
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        for loser in pending:
+                            loser.cancel()
+                        if future is not primary:
+                            _increase('hedge_wins')
+                        return future.result()
+                    error = error or future.exception()
+            raise error
+
+        def hedge_stats() -> dict:
+            with lock:
+                stats = dict(counters)
+            stats.update(tracker.snapshot())
+            stats['delay'] = delay_ms / 1000 if delay_ms is not None else tracker.value(min_samples)
+            return stats
+
+        _execute.hedge_stats = hedge_stats
+        return extended_classmethod(_execute)
+
+    return wrapper
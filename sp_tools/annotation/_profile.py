@@ -0,0 +1,319 @@
+import functools
+import inspect
+import os
+import threading
+import time
+from time import perf_counter
+
+from .._fork import after_fork_in_child, register_instance
+from ..logger import get_logger
+from ..logger.logger import _get_properties, _parse_bool
+from .common import annotation, extended_annotation, extended_classmethod
+
+__log = get_logger()
+
+_ENV_PREFIX = 'profile.'
+# 配置刷新间隔, 单位: s
+_REFRESH_INTERVAL = 5
+
+# 同一时刻仅剖析一次调用: cProfile 3.12+ 基于 sys.monitoring, 不支持多个 Profile 同时启用
+_profiling = threading.Lock()
+
+
+class _ProfileConfig:
+    """
+    剖析配置, 由后台线程定期从环境变量(或 configure_profile 传入的 properties)刷新, 调用时仅读取属性
+    """
+    __slots__ = ('properties', 'open', 'every', 'slow_threshold_ms', 'memory', 'top', 'interval', 'file')
+
+    def __init__(self):
+        self.properties = None
+        self.refresh()
+
+    def refresh(self):
+        if self.properties is None:
+            get = lambda key, default=None: os.environ.get(_ENV_PREFIX + key, default)
+        else:
+            get = lambda key, default=None: _get_properties(self.properties, _ENV_PREFIX + key, default)
+        threshold = get('slowThresholdMs')
+        self.every = int(get('every', 100))
+        self.slow_threshold_ms = float(threshold) if threshold not in (None, '') else None
+        self.memory = _parse_bool(get('memory', 'False'))
+        self.top = int(get('top', 20))
+        self.interval = float(get('interval', 60))
+        self.file = get('file') or None
+        # 最后赋值, 开启时其余配置已就绪
+        self.open = _parse_bool(get('open', 'False'))
+
+
+_config = _ProfileConfig()
+
+
+class _FunctionProfile:
+    """
+    单个方法的剖析结果累计: cProfile 统计按调用合并, tracemalloc 分配按代码行合并
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.armed = False
+        self.__lock = threading.Lock()
+        self.__stats = None
+        self.__allocations = {}
+        self.__profiled = 0
+        self.__slow = 0
+        register_instance(self)
+
+    def record(self, profiler, allocations, slow):
+        import pstats
+        profiler.create_stats()
+        with self.__lock:
+            if self.__stats is None:
+                self.__stats = pstats.Stats(profiler)
+            else:
+                self.__stats.add(profiler)
+            self.__profiled += 1
+            if slow:
+                self.__slow += 1
+            for site, size, count in allocations:
+                total = self.__allocations.get(site)
+                if total is None:
+                    self.__allocations[site] = [size, count]
+                else:
+                    total[0] += size
+                    total[1] += count
+
+    def snapshot(self, top) -> dict:
+        with self.__lock:
+            rows = list(self.__stats.stats.items()) if self.__stats is not None else []
+            allocations = sorted(self.__allocations.items(), key=lambda item: item[1][0], reverse=True)[:top]
+            snapshot = {'name': self.name, 'calls': self.calls, 'profiled': self.__profiled,
+                        'slow_triggered': self.__slow}
+        # 去除剖析器自身的 disable 调用
+        rows = [row for row in rows if row[0][2] != "<method 'disable' of '_lsprof.Profiler' objects>"]
+        rows.sort(key=lambda row: row[1][2], reverse=True)
+        snapshot['hotspots'] = [{'function': f'{file}:{line}({func})', 'ncalls': nc, 'tottime': tt, 'cumtime': ct}
+                                for (file, line, func), (_, nc, tt, ct, _) in rows[:top]]
+        snapshot['allocations'] = [{'site': site, 'size': size, 'count': count}
+                                   for site, (size, count) in allocations]
+        return snapshot
+
+    def reset(self):
+        with self.__lock:
+            self.__stats = None
+            self.__allocations = {}
+            self.__profiled = self.__slow = 0
+
+    def _after_fork(self):
+        self.__lock = threading.Lock()
+
+
+_profiles = {}
+_profiles_lock = threading.Lock()
+_reporter = None
+
+
+def _get_profile(name) -> _FunctionProfile:
+    with _profiles_lock:
+        profile_ = _profiles.setdefault(name, _FunctionProfile(name))
+        if _reporter is None:
+            _start_reporter()
+    return profile_
+
+
+def _start_reporter():
+    global _reporter
+    _reporter = threading.Thread(target=_run_reporter, name='sp_tools-profile', daemon=True)
+    _reporter.start()
+
+
+@after_fork_in_child
+def _reset_after_fork():
+    # 重新启动后台线程以继续刷新配置及输出剖析结果
+    global _profiles_lock, _profiling
+    _profiles_lock = threading.Lock()
+    _profiling = threading.Lock()
+    if _reporter is not None:
+        _start_reporter()
+
+
+def configure_profile(properties: dict = None):
+    """
+    立即刷新剖析配置(否则每5秒从配置来源刷新一次)
+    :param properties: 配置字典, 如 {'profile': {'open': 'True', 'every': '100'}}, 传入后以该字典代替环境变量,
+                       传入 None 时恢复读取环境变量
+    """
+    _config.properties = properties
+    _config.refresh()
+
+
+def get_profile_stats(top=None) -> dict:
+    """
+    获取所有@profile方法的剖析结果(累计), 按方法限定名(或 name 参数)区分:
+    calls: 开启剖析期间的调用次数, profiled: 被剖析的调用次数, slow_triggered: 其中因慢调用触发的次数,
+    hotspots: 按自身耗时(tottime, 单位: s)排序的前 top 个函数, allocations: 按分配字节数排序的前 top 个代码行
+    :param top: 输出条数, 默认为配置 profile.top
+    """
+    top = top or _config.top
+    return {name: p.snapshot(top) for name, p in list(_profiles.items())}
+
+
+def reset_profile_stats():
+    for p in list(_profiles.values()):
+        p.reset()
+
+
+def format_profile_report(top=None) -> str:
+    """
+    格式化剖析结果(每个方法一段), 无剖析结果时返回空字符串
+    """
+    lines = []
+    for s in get_profile_stats(top).values():
+        if not s['profiled']:
+            continue
+        lines.append(f"[profile] {s['name']} calls={s['calls']} profiled={s['profiled']} "
+                     f"slow_triggered={s['slow_triggered']}")
+        lines.append(f"  {'tottime':>10} {'cumtime':>10} {'ncalls':>8}  function")
+        for h in s['hotspots']:
+            lines.append(f"  {h['tottime']:10.6f} {h['cumtime']:10.6f} {h['ncalls']:8d}  {h['function']}")
+        if s['allocations']:
+            lines.append(f"  {'size':>10} {'count':>8}  allocation site")
+            for a in s['allocations']:
+                lines.append(f"  {a['size']:10d} {a['count']:8d}  {a['site']}")
+    return '\n'.join(lines)
+
+
+def _write_report():
+    report = format_profile_report()
+    if not report:
+        return
+    if _config.file:
+        with open(_config.file, 'a', encoding='utf-8') as f:
+            f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')}\n{report}\n")
+    else:
+        __log.info('%s', report)
+
+
+def _run_reporter():
+    """
+    后台线程: 定期刷新配置, 开启剖析且 profile.interval > 0 时每 interval 秒输出一次剖析结果
+    """
+    last_report = time.monotonic()
+    while True:
+        time.sleep(_REFRESH_INTERVAL)
+        try:
+            _config.refresh()
+            now = time.monotonic()
+            if _config.open and 0 < _config.interval <= now - last_report:
+                last_report = now
+                _write_report()
+        except Exception:
+            __log.exception('[profile] report failed')
+
+
+def _allocations(before, after):
+    """
+    两次 tracemalloc 快照之间新增的内存分配, 按代码行合并: [(代码行, 字节数, 分配次数)]
+    """
+    import tracemalloc
+    exclude = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__))
+    after = after.filter_traces(exclude)
+    if before is None:
+        stats = [(s.traceback[0], s.size, s.count) for s in after.statistics('lineno')]
+    else:
+        stats = [(s.traceback[0], s.size_diff, s.count_diff)
+                 for s in after.compare_to(before.filter_traces(exclude), 'lineno') if s.size_diff > 0]
+    return [(f'{frame.filename}:{frame.lineno}', size, count) for frame, size, count in stats]
+
+
+def _profiled_call(profile_, func, args, kwargs, memory, slow):
+    """
+    以 cProfile(及 tracemalloc)剖析一次调用, 调用方已持有 _profiling 锁
+    """
+    import cProfile
+    tracemalloc = None
+    before = None
+    started = False
+    if memory:
+        import tracemalloc
+        if tracemalloc.is_tracing():
+            before = tracemalloc.take_snapshot()
+        else:
+            tracemalloc.start()
+            started = True
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+    finally:
+        allocations = ()
+        if tracemalloc is not None:
+            after = tracemalloc.take_snapshot()
+            if started:
+                tracemalloc.stop()
+            allocations = _allocations(before, after)
+        profile_.record(profiler, allocations, slow)
+
+
+@annotation
+@extended_annotation
+def profile(ignore=False, every=None, slow_threshold_ms=None, memory=None, name=None):
+    """
+    采样剖析注解, 开启剖析(profile.open)后, 每 every 次调用以 cProfile(及 tracemalloc)剖析一次, 耗时超过
+    slow_threshold_ms 的调用之后的下一次调用也被剖析; 剖析结果按方法累计, 每 profile.interval 秒通过全局日志
+    (或 profile.file 文件)输出耗时最多的函数及内存分配最多的代码行. 未开启时每次调用仅多一次配置判断, 可保留在生产代码中.
+    配置来源同全局日志(环境变量或 configure_profile 传入的字典), 每5秒刷新一次, 使用方式:
+        @profile(every=100)
+        def f():
+            pass
+    :param ignore: 是否忽略该注解
+    :param every: 每多少次调用剖析一次, 默认为配置 profile.every, 0 表示不按次数采样
+    :param slow_threshold_ms: 慢调用阈值, 单位: ms, 默认为配置 profile.slowThresholdMs, None 表示不按耗时触发
+    :param memory: 是否同时以 tracemalloc 统计内存分配, 默认为配置 profile.memory
+    :param name: 统计名称, 默认为方法限定名, 同名方法共用统计
+    :return 装饰后的方法新增 profile_stats() 获取该方法的剖析结果
+    """
+
+    def wrapper(func):
+        if ignore:
+            return func
+        if inspect.iscoroutinefunction(func):
+            # 协程在多次 await 之间切换执行, 剖析结果会混入其他协程, 不支持
+            raise ValueError(f'@profile does not support coroutine function: {func.__qualname__}')
+        profile_ = _get_profile(name or func.__qualname__)
+        config = _config
+
+        @functools.wraps(func)
+        def _execute(*args, **kwargs):
+            if not config.open:
+                return func(*args, **kwargs)
+            profile_.calls += 1
+            sample_every = config.every if every is None else every
+            slow = profile_.armed
+            # 持有的锁对象: 在剖析中的调用内 fork 时, 子进程中 _profiling 已重新创建
+            lock = _profiling
+            if (slow or (sample_every and profile_.calls % sample_every == 0)) and lock.acquire(blocking=False):
+                try:
+                    profile_.armed = False
+                    return _profiled_call(profile_, func, args, kwargs,
+                                          config.memory if memory is None else memory, slow)
+                finally:
+                    lock.release()
+            threshold = config.slow_threshold_ms if slow_threshold_ms is None else slow_threshold_ms
+            if threshold is None:
+                return func(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if (perf_counter() - start) * 1000 > threshold:
+                    profile_.armed = True
+
+        _execute.profile_stats = lambda top=None: profile_.snapshot(top or config.top)
+        return extended_classmethod(_execute)
+
+    return wrapper
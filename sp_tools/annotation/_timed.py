@@ -0,0 +1,315 @@
+import functools
+import inspect
+import logging
+import threading
+import weakref
+from collections import deque
+from time import perf_counter_ns
+
+from .._fork import after_fork_in_child, register_instance
+from ..logger import get_logger
+from .common import annotation, extended_annotation, extended_classmethod
+
+__log = get_logger()
+
+# 对数线性分桶: 每个2的幂区间再等分为 2 ** _SUB_BITS 个桶, 相对误差不超过 1 / 2 ** _SUB_BITS
+_SUB_BITS = 4
+_SUB_COUNT = 1 << _SUB_BITS
+_BUCKETS = (64 - _SUB_BITS + 1) << _SUB_BITS
+
+
+def _bucket_bounds(index):
+    """
+    桶的取值范围 [lower, upper), 单位: ns
+    """
+    if index < _SUB_COUNT:
+        return index, index + 1
+    shift = (index >> _SUB_BITS) - 1
+    lower = (_SUB_COUNT + (index & (_SUB_COUNT - 1))) << shift
+    return lower, lower + (1 << shift)
+
+
+class _Histogram:
+    """
+    单个线程的耗时直方图, 仅由所属线程写入, 无需加锁
+    """
+    __slots__ = ('ident', 'counts', 'calls', 'errors', 'total', 'max')
+
+    def __init__(self, ident=None):
+        self.ident = ident
+        self.counts = [0] * _BUCKETS
+        self.calls = 0
+        self.errors = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns, error=False):
+        e = ns.bit_length()
+        index = ns if e <= _SUB_BITS else ((e - _SUB_BITS) << _SUB_BITS) + (ns >> (e - _SUB_BITS - 1)) - _SUB_COUNT
+        self.counts[index] += 1
+        self.calls += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+        if error:
+            self.errors += 1
+
+    def merge(self, other):
+        counts = self.counts
+        for i, c in enumerate(other.counts):
+            if c:
+                counts[i] += c
+        self.calls += other.calls
+        self.errors += other.errors
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+
+class _ThreadExit:
+    """
+    仅由线程本地存储引用, 线程结束时随之释放, 用于触发该线程直方图的归并
+    """
+    __slots__ = ('__weakref__',)
+
+
+class Timer:
+    """
+    方法耗时统计: 每个线程写入各自的对数线性直方图(记录无锁), 读取快照时合并, 线程结束时其直方图归并至 retired
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.__local = threading.local()
+        self.__histograms = set()
+        self.__exited = deque()
+        self.__retired = _Histogram()
+        self.__lock = threading.Lock()
+        register_instance(self)
+
+    @property
+    def local(self) -> threading.local:
+        """
+        线程本地存储, 当前线程已写入时其 histogram 属性为该线程的直方图
+        """
+        return self.__local
+
+    def histogram(self) -> _Histogram:
+        """
+        当前线程的直方图
+        """
+        try:
+            return self.__local.histogram
+        except AttributeError:
+            histogram = self.__local.histogram = _Histogram(threading.get_ident())
+            with self.__lock:
+                self.__histograms.add(histogram)
+            exit_ = self.__local.exit = _ThreadExit()
+            weakref.finalize(exit_, self.__retire, histogram).atexit = False
+            return histogram
+
+    def __retire(self, histogram):
+        # 线程结束时执行; 锁被其他线程持有(或 fork 出的子进程中锁尚未重置)时不等待, 留待下次获取到锁时归并
+        self.__exited.append(histogram)
+        if self.__lock.acquire(False):
+            try:
+                self.__merge_exited()
+            finally:
+                self.__lock.release()
+
+    def __merge_exited(self):
+        exited = self.__exited
+        while exited:
+            histogram = exited.popleft()
+            if histogram in self.__histograms:
+                self.__histograms.remove(histogram)
+                self.__retired.merge(histogram)
+
+    def record(self, ns, error=False):
+        self.histogram().record(ns, error)
+
+    def snapshot(self) -> dict:
+        """
+        耗时快照(累计): calls: 调用次数, errors: 异常次数, mean/p50/p90/p99/max: 耗时, 单位: ms
+        """
+        merged = _Histogram()
+        with self.__lock:
+            self.__merge_exited()
+            alive = list(self.__histograms)
+            merged.merge(self.__retired)
+        for h in alive:
+            merged.merge(h)
+        snapshot = {'name': self.name, 'calls': merged.calls, 'errors': merged.errors,
+                    'mean': merged.total / merged.calls / 1e6 if merged.calls else 0.0}
+        for p in (50, 90, 99):
+            snapshot[f'p{p}'] = _percentile(merged, p) / 1e6
+        snapshot['max'] = merged.max / 1e6
+        return snapshot
+
+    def reset(self):
+        with self.__lock:
+            self.__merge_exited()
+            self.__retired = _Histogram()
+            for h in self.__histograms:
+                h.counts = [0] * _BUCKETS
+                h.calls = h.errors = h.total = h.max = 0
+
+    def _after_fork(self):
+        # 子进程中仅有调用 fork 的线程, 其他线程的直方图直接归并
+        self.__lock = threading.Lock()
+        ident = threading.get_ident()
+        self.__exited.extend(h for h in self.__histograms if h.ident != ident)
+        self.__merge_exited()
+
+
+def _percentile(histogram, p):
+    if not histogram.calls:
+        return 0
+    rank = histogram.calls * p / 100
+    seen = 0
+    for i, c in enumerate(histogram.counts):
+        seen += c
+        if c and seen >= rank:
+            lower, upper = _bucket_bounds(i)
+            return min((lower + upper) / 2, histogram.max)
+    return histogram.max
+
+
+_timers = {}
+_timers_lock = threading.Lock()
+
+
+def get_timer(name) -> Timer:
+    """
+    获取(首次调用时创建)指定名称的耗时统计
+    """
+    timer = _timers.get(name)
+    if timer is None:
+        with _timers_lock:
+            timer = _timers.setdefault(name, Timer(name))
+    return timer
+
+
+def get_timed_stats() -> dict:
+    """
+    获取所有@timed方法的耗时快照, 按方法限定名(或 name 参数)区分
+    """
+    return {name: timer.snapshot() for name, timer in list(_timers.items())}
+
+
+_reporter = None
+_reporter_args = None
+_reporter_lock = threading.Lock()
+
+
+def start_timed_report(interval=60, log_=__log, level=logging.INFO):
+    """
+    启动后台线程, 每 interval 秒通过日志输出一次所有@timed方法的耗时汇总(每个方法一行), 重复调用仅首次生效
+    :param interval: 输出间隔, 单位: s
+    :param log_: 日志对象(默认使用内置全局日志)
+    :param level: 日志级别
+    """
+    with _reporter_lock:
+        if _reporter is not None:
+            return
+        _start_reporter(interval, log_, level)
+
+
+def _start_reporter(interval, log_, level):
+    global _reporter, _reporter_args
+    stop = threading.Event()
+
+    def _report():
+        while not stop.wait(interval):
+            if not log_.isEnabledFor(level):
+                continue
+            for s in get_timed_stats().values():
+                log_.log(level, '[timed] %s calls=%d errors=%d mean=%.3fms p50=%.3fms p90=%.3fms p99=%.3fms '
+                                'max=%.3fms', s['name'], s['calls'], s['errors'], s['mean'], s['p50'], s['p90'],
+                         s['p99'], s['max'])
+
+    _reporter = stop
+    _reporter_args = (interval, log_, level)
+    threading.Thread(target=_report, name='sp_tools-timed-report', daemon=True).start()
+
+
+@after_fork_in_child
+def _reset_after_fork():
+    # 已启动汇总输出时重新启动
+    global _reporter_lock, _timers_lock
+    _reporter_lock = threading.Lock()
+    _timers_lock = threading.Lock()
+    if _reporter is not None:
+        _start_reporter(*_reporter_args)
+
+
+def stop_timed_report():
+    global _reporter
+    with _reporter_lock:
+        if _reporter is not None:
+            _reporter.set()
+            _reporter = None
+
+
+@annotation
+@extended_annotation
+def timed(ignore=False, name=None):
+    """
+    耗时统计注解, 以 perf_counter_ns 记录每次调用耗时至进程内直方图(不输出日志), 使用方式:
+        @timed
+        def f():
+            pass
+    :param ignore: 是否忽略该注解
+    :param name: 统计名称, 默认为方法限定名, 同名方法共用统计
+    :return 装饰后的方法新增 timed_stats() 获取耗时快照(p50/p90/p99/max等)
+    """
+
+    def wrapper(func):
+        if ignore:
+            return func
+        timer = get_timer(name or func.__qualname__)
+        local = timer.local
+        histogram = timer.histogram
+
+        # 调用路径上仅一层包装且不经过 Timer 方法, 以控制每次调用的额外开销
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def _async_execute(*args, **kwargs):
+                start = perf_counter_ns()
+                try:
+                    result = await func(*args, **kwargs)
+                except BaseException:
+                    histogram().record(perf_counter_ns() - start, True)
+                    raise
+                histogram().record(perf_counter_ns() - start)
+                return result
+
+            _async_execute.timed_stats = timer.snapshot
+            return extended_classmethod(_async_execute)
+
+        @functools.wraps(func)
+        def _execute(*args, **kwargs):
+            start = perf_counter_ns()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                histogram().record(perf_counter_ns() - start, True)
+                raise
+            ns = perf_counter_ns() - start
+            try:
+                h = local.histogram
+            except AttributeError:
+                h = histogram()
+            # 同 _Histogram.record, 内联以省去一次方法调用
+            e = ns.bit_length()
+            index = ns if e <= _SUB_BITS else ((e - _SUB_BITS) << _SUB_BITS) + (ns >> (e - _SUB_BITS - 1)) - _SUB_COUNT
+            h.counts[index] += 1
+            h.calls += 1
+            h.total += ns
+            if ns > h.max:
+                h.max = ns
+            return result
+
+        _execute.timed_stats = timer.snapshot
+        return extended_classmethod(_execute)
+
+    return wrapper
@@ -0,0 +1,77 @@
+import functools
+import inspect
+import threading
+from concurrent.futures import Executor, TimeoutError as FutureTimeoutError
+
+from .cancel import CallTimeoutError, CancellationToken, current_token, run_with_token, wait_for
+from .common import annotation, extended_annotation, extended_classmethod
+from .pool import get_pool
+
+# 默认执行线程池, 与 @parallel 的默认线程池分开, 避免在 @parallel 任务中调用时互相占满
+TIMEOUT_POOL = 'timeout'
+
+
+@annotation
+@extended_annotation
+def timeout(ignore=False, seconds=60, pool=None):
+    """
+    超时注解, 每次调用在线程池中执行并最多等待 seconds 秒, 超时后放弃该次调用并抛出 CallTimeoutError(内置 TimeoutError 的子类),
+    放弃的调用通过取消令牌通知(方法内通过 current_token() 检查并自行退出以释放线程). 与 @retry 组合时每次尝试单独计时:
+        @retry(retry_times=3, ex=TimeoutError)
+        @timeout(seconds=5)
+        def f():
+            pass
+    :param ignore: 是否忽略该注解
+    :param seconds: 超时时间, 单位: s
+    :param pool: 执行的线程池, 支持 concurrent.futures.Executor 对象或命名线程池名称(见 get_pool),
+                 若不传该值使用进程内共享的 timeout 线程池
+    :return 装饰后的方法新增 timeout_stats() 获取调用及超时次数; 协程方法使用 asyncio.wait_for(超时同样抛出 CallTimeoutError), 不经过线程池
+    """
+
+    def wrapper(func):
+        if ignore:
+            return func
+        counters = {'calls': 0, 'timeouts': 0}
+        lock = threading.Lock()
+
+        def _increase(field):
+            with lock:
+                counters[field] += 1
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def _async_execute(*args, **kwargs):
+                _increase('calls')
+                try:
+                    return await wait_for(func(*args, **kwargs), seconds, func.__qualname__)
+                except CallTimeoutError:
+                    _increase('timeouts')
+                    raise
+
+            _execute = _async_execute
+        else:
+            @functools.wraps(func)
+            def _execute(*args, **kwargs):
+                executor = pool if isinstance(pool, Executor) else get_pool(pool or TIMEOUT_POOL)
+                _increase('calls')
+                token = CancellationToken(seconds, current_token())
+                future = executor.submit(run_with_token, token, func, args, kwargs)
+                try:
+                    return future.result(timeout=token.remaining())
+                except FutureTimeoutError:
+                    if future.done() and not token.is_cancelled():
+                        # 方法自身抛出的 TimeoutError
+                        raise
+                future.cancel()
+                token.cancel(CallTimeoutError(f'{func.__qualname__} timed out after {seconds}s'))
+                _increase('timeouts')
+                raise token.error
+
+        def timeout_stats() -> dict:
+            with lock:
+                return dict(counters)
+
+        _execute.timeout_stats = timeout_stats
+        return extended_classmethod(_execute)
+
+    return wrapper
@@ -0,0 +1,130 @@
+import random
+import threading
+import time
+import weakref
+
+BACKOFF_FIXED = 'fixed'
+BACKOFF_EXPONENTIAL = 'exponential'
+BACKOFF_EXPONENTIAL_JITTER = 'exponential_jitter'
+BACKOFF_DECORRELATED_JITTER = 'decorrelated_jitter'
+
+
+def backoff_strategy(backoff=None, interval=5, max_interval=60, multiplier=2):
+    """
+    获取退避策略, 返回 strategy(attempt, previous) -> 下次重试间隔(s)
+    :param backoff: 退避策略 fixed: 固定间隔, exponential: 指数退避, exponential_jitter: 指数退避+全抖动,
+                    decorrelated_jitter: 去相关抖动, 也可直接传入 strategy(attempt, previous) 方法
+    :param interval: 基础间隔, 单位: s
+    :param max_interval: 最大间隔, 单位: s
+    :param multiplier: 指数退避倍数
+    """
+    if callable(backoff):
+        return backoff
+    if backoff is None or backoff == BACKOFF_FIXED:
+        return lambda attempt, previous: interval
+    if backoff == BACKOFF_EXPONENTIAL:
+        return lambda attempt, previous: min(max_interval, interval * multiplier ** attempt)
+    if backoff == BACKOFF_EXPONENTIAL_JITTER:
+        return lambda attempt, previous: random.uniform(0, min(max_interval, interval * multiplier ** attempt))
+    if backoff == BACKOFF_DECORRELATED_JITTER:
+        return lambda attempt, previous: min(max_interval, random.uniform(interval, max(interval, previous) * 3))
+    raise ValueError(f'unsupported backoff: {backoff}')
+
+
+class RetryBudget:
+    """
+    重试预算(令牌桶), 可在多个@retry间共享:
+    每次调用存入 ratio 个令牌, 每秒补充 min_per_second 个令牌, 每次重试消耗1个令牌,
+    令牌不足时放弃重试, 故障期间重试量被限制在调用量的 ratio 比例内, 避免重试放大故障
+    """
+
+    def __init__(self, ratio=0.2, min_per_second=10, max_tokens=None):
+        """
+        :param ratio: 每次调用存入的令牌数(即允许的重试比例)
+        :param min_per_second: 每秒补充的令牌数(保证低调用量时也能重试)
+        :param max_tokens: 令牌上限, 默认为 min_per_second 的10倍
+        """
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens if max_tokens is not None else max(1, min_per_second * 10)
+        self.__tokens = float(self.max_tokens)
+        self.__last_time = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def deposit(self):
+        with self.__lock:
+            self.__tokens = min(self.max_tokens, self.__tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        with self.__lock:
+            now = time.monotonic()
+            self.__tokens = min(self.max_tokens, self.__tokens + (now - self.__last_time) * self.min_per_second)
+            self.__last_time = now
+            if self.__tokens >= 1:
+                self.__tokens -= 1
+                return True
+            return False
+
+    @property
+    def tokens(self):
+        return self.__tokens
+
+
+class RetryStats:
+    """
+    重试计数器
+    calls: 调用次数, attempts: 实际执行次数, retries: 重试次数, successes_after_retry: 重试后成功次数,
+    failures: 最终失败次数, budget_rejections: 因重试预算不足放弃重试次数, deadline_exceeded: 因超出总耗时限制放弃重试次数
+    """
+    FIELDS = ('calls', 'attempts', 'retries', 'successes_after_retry', 'failures', 'budget_rejections',
+              'deadline_exceeded')
+
+    def __init__(self, parent=None):
+        """
+        :param parent: 汇总计数器, 读取其计数时包含所有子计数器的计数(计数时只需更新自身)
+        """
+        # attempts 恒等于 calls + retries, 读取时计算, 调用路径上少一次计数
+        self.__counters = {field: 0 for field in self.FIELDS if field != 'attempts'}
+        self.__children = weakref.WeakSet()
+        # 子计数器被回收时由GC回调合并计数, 需可重入
+        self.__lock = threading.RLock()
+        if parent is not None:
+            parent.__children.add(self)
+            weakref.finalize(self, parent.__merge, self.__counters)
+
+    def increase(self, field, value=1):
+        with self.__lock:
+            self.__counters[field] += value
+
+    def snapshot(self) -> dict:
+        with self.__lock:
+            counters = dict(self.__counters)
+            children = list(self.__children)
+        for child in children:
+            for field, value in child.snapshot().items():
+                if field != 'attempts':
+                    counters[field] += value
+        counters['attempts'] = counters['calls'] + counters['retries']
+        return {field: counters[field] for field in self.FIELDS}
+
+    def __merge(self, counters):
+        with self.__lock:
+            for field, value in counters.items():
+                self.__counters[field] += value
+
+    def __getattr__(self, item):
+        if item in RetryStats.FIELDS:
+            return self.snapshot()[item]
+        raise AttributeError(item)
+
+
+# 所有@retry共享的默认重试预算及全局计数器
+default_retry_budget = RetryBudget()
+_global_retry_stats = RetryStats()
+
+
+def get_retry_stats() -> dict:
+    """
+    获取所有@retry的全局重试计数
+    """
+    return _global_retry_stats.snapshot()
@@ -0,0 +1,288 @@
+import contextvars
+import heapq
+import itertools
+import sys
+import threading
+import time
+from concurrent.futures import CancelledError, TimeoutError as FutureTimeoutError
+
+from .._fork import after_fork_in_child
+from ..logger import get_logger
+
+__log = get_logger()
+
+if sys.version_info >= (3, 11):
+    _TIMEOUT_BASES = (TimeoutError,)
+else:
+    # 3.11 之前 concurrent.futures.TimeoutError、asyncio.TimeoutError 与内置 TimeoutError 为不同的类(3.7 前两者相同)
+    import asyncio
+    _TIMEOUT_BASES = tuple(dict.fromkeys((FutureTimeoutError, asyncio.TimeoutError, TimeoutError)))
+
+
+class CallTimeoutError(*_TIMEOUT_BASES):
+    """
+    调用超时(@timeout、@parallel(timeout) 及取消令牌到达截止时间), 同时是内置 TimeoutError、
+    concurrent.futures.TimeoutError 及 asyncio.TimeoutError 的子类, 捕获其中任意一个均可
+    """
+
+
+# 令牌的等待事件在首次等待时才创建, 创建及取消时加锁
+_event_lock = threading.Lock()
+
+
+class CancellationToken:
+    """
+    协作式取消令牌: 调用 cancel() 或到达截止时间后视为已取消, 执行中的方法通过 current_token() 获取当前令牌,
+    在循环或等待处调用 raise_if_cancelled()/wait() 及时退出(Python无法强制终止线程)
+    """
+    __slots__ = ('__event', '__deadline', '__parent', '__error')
+
+    def __init__(self, timeout=None, parent=None):
+        """
+        :param timeout: 超时时间, 单位: s, 到达后视为已取消(错误为 CallTimeoutError), None 表示不限制
+        :param parent: 上级令牌, 上级取消时本令牌同时视为已取消
+        """
+        self.__event = None
+        self.__deadline = time.monotonic() + timeout if timeout is not None else None
+        self.__parent = parent if parent is not None and parent is not _NEVER else None
+        self.__error = None
+
+    @property
+    def deadline(self):
+        """
+        截止时间(time.monotonic), None 表示不限制
+        """
+        return self.__deadline
+
+    @property
+    def error(self) -> BaseException:
+        """
+        取消原因(CancelledError 或 CallTimeoutError), 未取消时为None
+        """
+        self.is_cancelled()
+        return self.__error
+
+    def cancel(self, error: BaseException = None):
+        """
+        取消, 重复调用时以第一次的取消原因为准
+        :param error: 取消原因, 默认为 CancelledError
+        """
+        with _event_lock:
+            if self.__error is None:
+                self.__error = error if error is not None else CancelledError()
+            event = self.__event
+        if event is not None:
+            event.set()
+
+    def is_cancelled(self) -> bool:
+        if self.__error is not None:
+            return True
+        if self.__deadline is not None and time.monotonic() >= self.__deadline:
+            self.cancel(CallTimeoutError('deadline exceeded'))
+            return True
+        if self.__parent is not None and self.__parent.is_cancelled():
+            self.cancel(self.__parent.error)
+            return True
+        return False
+
+    def raise_if_cancelled(self):
+        """
+        已取消时抛出取消原因(CancelledError 或 CallTimeoutError)
+        """
+        if self.is_cancelled():
+            raise self.__error
+
+    def remaining(self):
+        """
+        距截止时间的剩余时间, 单位: s, 不限制时返回None
+        """
+        if self.__deadline is None:
+            return None
+        return max(0.0, self.__deadline - time.monotonic())
+
+    def wait(self, timeout=None) -> bool:
+        """
+        等待至取消或超过 timeout 秒(不超过截止时间), 返回是否已取消, 可代替 time.sleep 使等待可被取消
+        """
+        with _event_lock:
+            if self.__event is None:
+                self.__event = threading.Event()
+                if self.__error is not None:
+                    self.__event.set()
+            event = self.__event
+        remaining = self.remaining()
+        if remaining is not None and (timeout is None or remaining < timeout):
+            timeout = remaining
+        if self.__parent is None:
+            event.wait(timeout)
+        else:
+            # 上级取消不会通知本令牌, 分段等待以检查上级状态
+            end = time.monotonic() + timeout if timeout is not None else None
+            while not self.is_cancelled():
+                step = 0.1 if end is None else min(0.1, end - time.monotonic())
+                if step <= 0:
+                    break
+                event.wait(step)
+        return self.is_cancelled()
+
+
+class _NeverCancelled(CancellationToken):
+    """
+    无取消令牌时 current_token() 返回的令牌, 不会被取消
+    """
+    __slots__ = ()
+
+    def cancel(self, error=None):
+        pass
+
+    def is_cancelled(self) -> bool:
+        return False
+
+    def wait(self, timeout=None) -> bool:
+        if timeout is None:
+            raise ValueError('waiting forever on a token that is never cancelled')
+        time.sleep(timeout)
+        return False
+
+
+_NEVER = _NeverCancelled()
+_current = contextvars.ContextVar('sp_tools_cancellation_token', default=_NEVER)
+# 线程id -> 该线程正在执行的调用的取消令牌, 进程退出时不再等待已被放弃(取消)的调用
+_running = {}
+
+
+def current_token() -> CancellationToken:
+    """
+    获取当前执行上下文(@parallel/@timeout 调用)的取消令牌, 不在此类调用中时返回不会被取消的令牌
+    """
+    return _current.get()
+
+
+def run_with_token(token, func, args, kwargs):
+    """
+    以 token 作为当前令牌执行方法, 开始前已取消时直接抛出取消原因
+    """
+    reset = _current.set(token)
+    ident = threading.get_ident()
+    outer = _running.get(ident)
+    _running[ident] = token
+    try:
+        token.raise_if_cancelled()
+        return func(*args, **kwargs)
+    finally:
+        if outer is None:
+            del _running[ident]
+        else:
+            _running[ident] = outer
+        _current.reset(reset)
+
+
+async def wait_for(awaitable, timeout, name):
+    """
+    同 asyncio.wait_for, 超时时抛出 CallTimeoutError(方法自身在超时前抛出的 TimeoutError 保持不变)
+    """
+    import asyncio
+    start = time.monotonic()
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        if time.monotonic() - start < timeout:
+            raise
+        raise CallTimeoutError(f'{name} timed out after {timeout}s') from None
+
+
+def is_abandoned(thread: threading.Thread) -> bool:
+    """
+    线程正在执行的 @parallel/@timeout 调用是否已被取消(超时), 已取消的调用不再有等待方
+    """
+    token = _running.get(thread.ident)
+    return token is not None and token.is_cancelled()
+
+
+def _log_callback_error():
+    __log.exception('[deadline] callback failed')
+
+
+class _DeadlineScheduler:
+    """
+    到期回调调度: 单个后台线程按截止时间依次执行回调, 已撤销的回调数超过一半时重建堆, 内存占用与进行中的调用数成正比
+    """
+
+    def __init__(self):
+        self.__heap = []
+        self.__seq = itertools.count()
+        self.__condition = threading.Condition(threading.Lock())
+        self.__thread = None
+        self.__dead = 0
+
+    def schedule(self, deadline, callback) -> list:
+        """
+        在 deadline(time.monotonic)时执行 callback(), 返回可用于撤销的条目
+        """
+        entry = [deadline, next(self.__seq), callback]
+        with self.__condition:
+            heapq.heappush(self.__heap, entry)
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, name='sp_tools-deadline', daemon=True)
+                self.__thread.start()
+            if self.__heap[0] is entry:
+                self.__condition.notify()
+        return entry
+
+    def cancel(self, entry):
+        with self.__condition:
+            if entry[2] is None:
+                return
+            entry[2] = None
+            self.__dead += 1
+            if self.__dead > 64 and self.__dead * 2 > len(self.__heap):
+                self.__heap = [e for e in self.__heap if e[2] is not None]
+                heapq.heapify(self.__heap)
+                self.__dead = 0
+
+    def _after_fork(self):
+        """
+        fork 出的子进程中后台线程已不存在, 父进程的到期回调也不在子进程执行
+        """
+        self.__heap = []
+        self.__condition = threading.Condition(threading.Lock())
+        self.__thread = None
+        self.__dead = 0
+
+    def __run(self):
+        condition = self.__condition
+        while True:
+            with condition:
+                heap = self.__heap
+                if not heap:
+                    condition.wait()
+                    continue
+                delay = heap[0][0] - time.monotonic()
+                if delay > 0:
+                    condition.wait(delay)
+                    continue
+                entry = heapq.heappop(heap)
+                callback = entry[2]
+                if callback is None:
+                    self.__dead -= 1
+                    continue
+                entry[2] = None
+            try:
+                callback()
+            except Exception:
+                _log_callback_error()
+
+
+deadline_scheduler = _DeadlineScheduler()
+
+
+@after_fork_in_child
+def _reset_after_fork():
+    global _event_lock
+    _event_lock = threading.Lock()
+    # 仅保留调用 fork 的线程
+    token = _running.get(threading.get_ident())
+    _running.clear()
+    if token is not None:
+        _running[threading.get_ident()] = token
+    deadline_scheduler._after_fork()
@@ -0,0 +1,242 @@
+import functools
+import inspect
+import logging
+import threading
+import time
+from collections import deque
+
+from ..logger import get_logger
+from .common import annotation, extended_annotation, extended_classmethod
+
+__log = get_logger()
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """
+    熔断器处于打开状态, 调用被直接拒绝
+    """
+
+    def __init__(self, name, retry_after):
+        super().__init__(f'circuit breaker {name} is open, retry after {retry_after:.3f}s')
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    熔断器: 基于最近 window_size 次调用结果的滑动窗口统计失败率,
+    失败率达到阈值后打开(直接拒绝调用), 经过 recovery_timeout 后进入半开状态放行少量试探调用,
+    试探调用全部成功则关闭, 任一失败则重新打开, 被取消(未得到结果)的试探调用归还试探许可.
+    关闭状态下成功调用无需加锁(deque.append 为原子操作)
+    """
+
+    def __init__(self, name, window_size=100, failure_threshold=0.5, minimum_calls=10, recovery_timeout=30,
+                 half_open_calls=1, log_=None, log_level=logging.WARNING):
+        """
+        :param name: 熔断器名称
+        :param window_size: 滑动窗口大小(最近调用次数)
+        :param failure_threshold: 打开熔断的失败率阈值(0~1)
+        :param minimum_calls: 窗口内达到该调用次数后才计算失败率
+        :param recovery_timeout: 打开后进入半开状态的等待时间, 单位: s
+        :param half_open_calls: 半开状态放行的试探调用次数
+        :param log_: 日志对象, 用于记录状态变更, 为None时不记录
+        :param log_level: 状态变更日志级别
+        """
+        self.name = name
+        self.window_size = window_size
+        self.failure_threshold = failure_threshold
+        self.minimum_calls = min(minimum_calls, window_size)
+        self.recovery_timeout = recovery_timeout
+        self.half_open_calls = max(1, half_open_calls)
+        self.state = STATE_CLOSED
+        self.rejected = 0
+        self.__log = log_
+        self.__log_level = log_level
+        self.__outcomes = deque(maxlen=window_size)
+        self.__opened_at = 0
+        self.__half_open_permits = 0
+        self.__half_open_successes = 0
+        self.__lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        是否放行本次调用
+        """
+        if self.state is STATE_CLOSED:
+            return True
+        with self.__lock:
+            if self.state is STATE_OPEN:
+                if time.monotonic() - self.__opened_at < self.recovery_timeout:
+                    self.rejected += 1
+                    return False
+                self.__transition(STATE_HALF_OPEN)
+            if self.state is STATE_HALF_OPEN:
+                if self.__half_open_permits <= 0:
+                    self.rejected += 1
+                    return False
+                self.__half_open_permits -= 1
+            return True
+
+    def retry_after(self) -> float:
+        """
+        距离进入半开状态的剩余时间, 单位: s
+        """
+        if self.state is not STATE_OPEN:
+            return 0
+        return max(0, self.__opened_at + self.recovery_timeout - time.monotonic())
+
+    def on_success(self):
+        if self.state is STATE_CLOSED:
+            self.__outcomes.append(False)
+            return
+        with self.__lock:
+            if self.state is STATE_HALF_OPEN:
+                self.__half_open_successes += 1
+                if self.__half_open_successes >= self.half_open_calls:
+                    self.__transition(STATE_CLOSED)
+
+    def on_failure(self):
+        with self.__lock:
+            if self.state is STATE_HALF_OPEN:
+                self.__transition(STATE_OPEN)
+            elif self.state is STATE_CLOSED:
+                outcomes = self.__outcomes
+                outcomes.append(True)
+                calls = len(outcomes)
+                if calls >= self.minimum_calls and sum(outcomes) / calls >= self.failure_threshold:
+                    self.__transition(STATE_OPEN)
+
+    def release(self):
+        """
+        放行的调用未得到结果(被取消或中断)时调用: 不计入统计, 半开状态下归还试探许可
+        """
+        if self.state is STATE_CLOSED:
+            return
+        with self.__lock:
+            if self.state is STATE_HALF_OPEN:
+                self.__half_open_permits = min(self.__half_open_permits + 1, self.half_open_calls)
+
+    def failure_rate(self) -> float:
+        outcomes = list(self.__outcomes)
+        return sum(outcomes) / len(outcomes) if outcomes else 0.0
+
+    def reset(self):
+        with self.__lock:
+            self.__transition(STATE_CLOSED)
+
+    def __transition(self, state):
+        previous = self.state
+        if state is STATE_OPEN:
+            self.__opened_at = time.monotonic()
+        elif state is STATE_HALF_OPEN:
+            self.__half_open_permits = self.half_open_calls
+            self.__half_open_successes = 0
+        else:
+            self.__outcomes.clear()
+        self.state = state
+        if previous is not state and self.__log is not None and self.__log.isEnabledFor(self.__log_level):
+            self.__log.log(self.__log_level, '[circuit_breaker] %s: %s -> %s', self.name, previous, state)
+
+
+@annotation
+@extended_annotation
+def circuit_breaker(ignore=False, window_size=100, failure_threshold=0.5, minimum_calls=10, recovery_timeout=30,
+                    half_open_calls=1, ex=Exception, key=None, fallback=None, log_=__log):
+    """
+    熔断注解, 依赖持续失败时直接拒绝调用(抛出 CircuitOpenError), 避免重试及线程长时间阻塞, 使用方式:
+        @circuit_breaker
+        def f():
+            pass
+    :param ignore: 是否忽略该注解
+    :param window_size: 滑动窗口大小(最近调用次数)
+    :param failure_threshold: 打开熔断的失败率阈值(0~1)
+    :param minimum_calls: 窗口内达到该调用次数后才计算失败率
+    :param recovery_timeout: 打开后进入半开状态的等待时间, 单位: s
+    :param half_open_calls: 半开状态放行的试探调用次数
+    :param ex: 计为失败的异常类型, 支持使用tuple or list方式设定多种异常类型, 其他异常计为成功
+    :param key: 熔断维度方法 key(*args, **kwargs), 为None时按方法熔断, 否则按返回值分别熔断
+    :param fallback: 熔断打开时的降级方法 fallback(*args, **kwargs), 为None时抛出 CircuitOpenError;
+                     装饰协程方法时降级方法可为协程方法
+    :param log_: 日志对象, 用于记录状态变更
+    """
+    ex_types = tuple(ex) if isinstance(ex, (list, tuple)) else ex
+
+    def wrapper(func):
+        if ignore:
+            return func
+        breakers = {}
+        lock = threading.Lock()
+
+        def _breaker(args, kwargs) -> CircuitBreaker:
+            k = None if key is None else key(*args, **kwargs)
+            breaker = breakers.get(k)
+            if breaker is None:
+                with lock:
+                    breaker = breakers.get(k)
+                    if breaker is None:
+                        name = func.__qualname__ if k is None else f'{func.__qualname__}[{k}]'
+                        breaker = CircuitBreaker(name, window_size, failure_threshold, minimum_calls,
+                                                 recovery_timeout, half_open_calls, log_)
+                        breakers[k] = breaker
+            return breaker
+
+        # 按方法熔断时在装饰时创建熔断器, 调用时无需查找
+        single = _breaker((), {}) if key is None else None
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def _async_execute(*args, **kwargs):
+                breaker = single if single is not None else _breaker(args, kwargs)
+                if not breaker.allow():
+                    if fallback is not None:
+                        result = fallback(*args, **kwargs)
+                        return await result if inspect.isawaitable(result) else result
+                    raise CircuitOpenError(breaker.name, breaker.retry_after())
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    if isinstance(e, ex_types):
+                        breaker.on_failure()
+                    else:
+                        breaker.on_success()
+                    raise e
+                except BaseException:
+                    # 调用被取消(如 CancelledError)或中断, 未得到结果
+                    breaker.release()
+                    raise
+                breaker.on_success()
+                return result
+
+            _async_execute.circuit_breakers = breakers
+            return extended_classmethod(_async_execute)
+
+        @functools.wraps(func)
+        def _execute(*args, **kwargs):
+            breaker = single if single is not None else _breaker(args, kwargs)
+            if not breaker.allow():
+                if fallback is not None:
+                    return fallback(*args, **kwargs)
+                raise CircuitOpenError(breaker.name, breaker.retry_after())
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if isinstance(e, ex_types):
+                    breaker.on_failure()
+                else:
+                    breaker.on_success()
+                raise e
+            except BaseException:
+                # 调用被取消(如 CancelledError)或中断, 未得到结果
+                breaker.release()
+                raise
+            breaker.on_success()
+            return result
+
+        _execute.circuit_breakers = breakers
+        return extended_classmethod(_execute)
+
+    return wrapper
@@ -1,9 +1,22 @@
 import threading
-from concurrent.futures import Executor
+import inspect
+import weakref
+import collections
+import itertools
+import os
+import concurrent.futures
+from concurrent.futures import Executor, Future
 from types import FunctionType, MethodType
 import logging
 import traceback
+import random
+import reprlib
 from ..logger import get_logger
+from .backoff import backoff_strategy, default_retry_budget, RetryStats, _global_retry_stats
+from .pool import get_pool, run_inline, check_policy, PoolRejectedError, DEFAULT_POOL, POLICY_BLOCK, POLICY_REJECT
+from .process import MODE_THREAD, MODE_PROCESS, DEFAULT_SHARED_MEMORY_THRESHOLD, get_process_pool
+from .process import register as register_process_target, submit as submit_process, map_by_name
+from .cancel import CallTimeoutError, CancellationToken, current_token, run_with_token, deadline_scheduler, wait_for
 import time
 import functools
 
@@ -34,11 +47,32 @@ def extended_annotation(func, default_=False):
     return wrapper
 
 
+def _defined_in_class(func) -> bool:
+    """
+    是否为类中定义的方法(限定名形如 A.f), 模块级方法(f)及方法内定义的方法(g.<locals>.f)不是
+    """
+    owner = getattr(func, '__qualname__', '').rpartition('.')[0]
+    return bool(owner) and not owner.endswith('<locals>')
+
+
 @annotation
 def extended_classmethod(func):
     """
-    拓展@classmethod支持
+    拓展@classmethod支持: 调用时第一个参数为类且第二个参数为该类实例时去除第一个参数.
+    是否需要处理在装饰时决定, 仅类中定义的方法返回包装后的方法, 其他方法原样返回(调用无额外开销);
+    各注解返回装饰后的方法前统一经过此方法
     """
+    if not _defined_in_class(func):
+        return func
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            if len(args) >= 2 and type(args[1]) == args[0]:
+                args = args[1:]
+            return await func(*args, **kwargs)
+
+        return async_wrapper
 
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
@@ -49,25 +83,171 @@ def extended_classmethod(func):
     return wrapper
 
 
-@annotation
-def extended_ignore(condition: bool, origin_func):
+class _BoundedRepr(reprlib.Repr):
     """
-    拓展忽略注解功能
-    :param condition: true 忽略， false 不忽略
-    :param origin_func: 实际方法
-    :return: function
+    限制单个参数输出大小的repr, 超出部分以...省略, 避免大对象(bytes/DataFrame等)生成超大临时字符串
     """
 
-    def wrapper(func):
-        @functools.wraps(origin_func)
-        def _execute(*args, **kwargs):
-            if not condition:
-                return func(*args, **kwargs)
-            return origin_func(*args, **kwargs)
+    def __init__(self, max_chars=None, max_items=None):
+        super().__init__()
+        if max_chars is not None:
+            self.maxstring = self.maxother = self.maxlong = max_chars
+        if max_items is not None:
+            self.maxtuple = self.maxlist = self.maxarray = self.maxdict = max_items
+            self.maxset = self.maxfrozenset = self.maxdeque = max_items
 
-        return _execute
+    def repr_bytes(self, x, level):
+        if len(x) <= self.maxstring:
+            return repr(x)
+        return '%r...(%d bytes)' % (x[:self.maxstring], len(x))
 
-    return wrapper
+    repr_bytearray = repr_bytes
+
+    def repr_memoryview(self, x, level):
+        return '<memory at %#x, %d bytes>' % (id(x), x.nbytes)
+
+
+class _LazyValue:
+    """
+    延迟渲染的格式化参数, 仅在日志真正输出时才计算字符串
+    """
+    __slots__ = ('value', 'repr_', 'as_str', 'owned')
+
+    def __init__(self, value, repr_, as_str=False, owned=False):
+        """
+        :param owned: value 为仅此处持有的字典(如调用的kwargs), 之后只有其中的值可能被修改
+        """
+        self.value = value
+        self.repr_ = repr_
+        self.as_str = as_str
+        self.owned = owned
+
+    def __str__(self):
+        if self.repr_ is None:
+            return str(self.value)
+        if self.as_str and isinstance(self.value, str):
+            if len(self.value) <= self.repr_.maxstring:
+                return self.value
+            return '%s...(%d chars)' % (self.value[:self.repr_.maxstring], len(self.value))
+        return self.repr_.repr(self.value)
+
+    __repr__ = __str__
+
+    def __format__(self, format_spec):
+        return format(str(self), format_spec)
+
+    def freeze(self, immutable):
+        """
+        缓冲或异步输出前的快照: 不可变的值保持延迟渲染, 其他值(之后可能被修改)立即按大小限制渲染
+        """
+        value = self.value
+        if immutable(value) or self.owned and all(immutable(v) for v in value.values()):
+            return self
+        return _LazyValue(str(self), None)
+
+
+class _LazyTraceback:
+    """
+    延迟渲染的异常栈
+    """
+    __slots__ = ('ex', 'tb')
+
+    def __init__(self, ex):
+        self.ex = ex
+        self.tb = ex.__traceback__
+
+    def __str__(self):
+        return ''.join(traceback.format_exception(type(self.ex), self.ex, self.tb))
+
+    __repr__ = __str__
+
+    def __format__(self, format_spec):
+        return format(str(self), format_spec)
+
+    def freeze(self, immutable):
+        return self
+
+
+class _LazyMessage:
+    """
+    延迟格式化的日志消息, 由handler在输出时调用str()完成格式化
+    """
+    __slots__ = ('format', 'kwargs')
+
+    def __init__(self, format, **kwargs):
+        self.format = format
+        self.kwargs = kwargs
+
+    def __str__(self):
+        return self.format.format(**self.kwargs)
+
+    def freeze(self, immutable):
+        """
+        缓冲或异步输出前的快照: 仅渲染可变的参数, 消息仍在输出时格式化
+        :param immutable: 判断值是否不可变的方法
+        """
+        kwargs = {}
+        for name, value in self.kwargs.items():
+            freeze = getattr(value, 'freeze', None)
+            if freeze is not None:
+                value = freeze(immutable)
+            elif not immutable(value):
+                value = str(value)
+            kwargs[name] = value
+        return _LazyMessage(self.format, **kwargs)
+
+
+class _ErrorCounter:
+    """
+    异常计数及按异常签名(异常类型 + 抛出位置)限流, 每个签名每 window 秒最多记录 limit 次日志
+    """
+
+    def __init__(self, limit=None, window=60):
+        self.limit = limit
+        self.window = window
+        self.__errors = 0
+        self.__suppressed = 0
+        # 签名 -> [窗口开始时间, 窗口内已记录次数, 上次记录后被限流次数]
+        self.__signatures = {}
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def signature(e):
+        tb = e.__traceback__
+        if tb is None:
+            return type(e), None, None
+        while tb.tb_next is not None:
+            tb = tb.tb_next
+        return type(e), tb.tb_frame.f_code.co_filename, tb.tb_lineno
+
+    def hit(self, e, record=True):
+        """
+        计数一次异常, 返回本次是否记录日志及此前被限流的次数
+        """
+        with self.__lock:
+            self.__errors += 1
+            if not record:
+                return False, 0
+            if self.limit is None:
+                return True, 0
+            now = time.monotonic()
+            signature = self.signature(e)
+            state = self.__signatures.get(signature)
+            if state is None:
+                state = self.__signatures[signature] = [now, 0, 0]
+            elif now - state[0] >= self.window:
+                state[0], state[1] = now, 0
+            if state[1] >= self.limit:
+                state[2] += 1
+                self.__suppressed += 1
+                return False, 0
+            suppressed, state[2] = state[2], 0
+            state[1] += 1
+            return True, suppressed
+
+    def snapshot(self) -> dict:
+        with self.__lock:
+            return {'errors': self.__errors, 'suppressed': self.__suppressed}
 
 
 @annotation
@@ -77,7 +257,13 @@ def log(ignore=False, log_=__log,
         level_=logging.INFO,
         err_enable=True,
         err_format: str = '@Recorder: @log\nFunction/Method: {method_}\nParameters: {args_}(*args) {kwargs_}(**kwargs)\nCost: {cost_}ms\nErr: {ex_}',
-        err_level=logging.ERROR):
+        err_level=logging.ERROR,
+        repr_max_chars=1000,
+        repr_max_items=100,
+        sample_rate=1.0,
+        slow_threshold_ms=None,
+        err_rate_limit=None,
+        err_rate_window=60):
     """
     日志注解 使用方式:
         @log
@@ -88,29 +274,79 @@ def log(ignore=False, log_=__log,
     :param format: 正常信息输出格式
     :param level_: 正常信息日志输出级别
     :param err_enable: 是否开启异常日志记录
-    :param err_format: 异常日志输出格式 (支持参数: method_: 调用方法名, args_: args参数, kwargs_: kwargs参数, cost_: 方法调用耗时毫秒, ex_: 发生异常时的异常栈, ex_msg_: 发生异常时的异常信息)
+    :param err_format: 异常日志输出格式 (支持参数: method_: 调用方法名, args_: args参数, kwargs_: kwargs参数, cost_: 方法调用耗时毫秒(未采样的调用为-), ex_: 发生异常时的异常栈, ex_msg_: 发生异常时的异常信息, suppressed_: 上次记录后同一异常被限流的次数)
     :param err_level: 异常日志输出级别
+    :param repr_max_chars: 单个参数/返回值输出的最大字符数, 超出部分省略, None 表示不限制
+    :param repr_max_items: 单个容器参数/返回值输出的最大元素个数, 超出部分省略, None 表示不限制
+    :param sample_rate: 正常调用的采样率(0~1), 仅采样的调用计时并记录日志, 是否采样在调用前决定, 未采样的调用无计时及格式化开销
+    :param slow_threshold_ms: 慢调用阈值, 单位: ms, 设置后仅记录耗时不低于该值的(采样)调用
+    :param err_rate_limit: 同一异常(异常类型 + 抛出位置)每 err_rate_window 秒最多记录的日志条数, None 表示不限制, 异常始终计数
+    :param err_rate_window: 异常日志限流窗口, 单位: s
+    :return 装饰后的方法新增 log_stats() 获取异常计数(errors: 异常次数, suppressed: 被限流的异常日志条数)
     """
+    repr_ = None if repr_max_chars is None and repr_max_items is None else _BoundedRepr(repr_max_chars,
+                                                                                         repr_max_items)
+    always_sample = sample_rate >= 1
 
     def wrapper(func):
+        if ignore:
+            return func
+        errors = _ErrorCounter(err_rate_limit, err_rate_window)
+
+        def _success(args, kwargs, result, start_time):
+            cost = (time.perf_counter() - start_time) * 1000
+            if slow_threshold_ms is not None and cost < slow_threshold_ms:
+                return
+            log_.log(level_, _LazyMessage(format, method_=func.__qualname__,
+                                          args_=_LazyValue(args, repr_),
+                                          kwargs_=_LazyValue(kwargs, repr_, owned=True),
+                                          return_=_LazyValue(result, repr_, as_str=True),
+                                          cost_=int(cost)))
+
+        def _failure(args, kwargs, e, start_time):
+            record, suppressed = errors.hit(e, err_enable and log_.isEnabledFor(err_level))
+            if record:
+                cost = '-' if start_time is None else int((time.perf_counter() - start_time) * 1000)
+                log_.log(err_level, _LazyMessage(err_format, method_=func.__qualname__,
+                                                 args_=_LazyValue(args, repr_),
+                                                 kwargs_=_LazyValue(kwargs, repr_, owned=True),
+                                                 ex_=_LazyTraceback(e), ex_msg_=_LazyValue(e, None),
+                                                 cost_=cost, suppressed_=suppressed))
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def _async_execute(*args, **kwargs):
+                # 采样决策在调用前完成, 未采样的调用不计时
+                start_time = time.perf_counter() if always_sample or random.random() < sample_rate else None
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    _failure(args, kwargs, e, start_time)
+                    raise e
+                # 日志级别未开启时不做任何格式化, 开启时交由handler输出时再格式化
+                if start_time is not None and log_.isEnabledFor(level_):
+                    _success(args, kwargs, result, start_time)
+                return result
+
+            _async_execute.log_stats = errors.snapshot
+            return extended_classmethod(_async_execute)
+
         @functools.wraps(func)
-        @extended_ignore(ignore, func)
-        @extended_classmethod
         def _execute(*args, **kwargs):
-            start_time = int(time.time() * 1000)
+            # 采样决策在调用前完成, 未采样的调用不计时
+            start_time = time.perf_counter() if always_sample or random.random() < sample_rate else None
             try:
                 result = func(*args, **kwargs)
-                log_.log(level_, format.format(method_=func.__qualname__, args_=args, kwargs_=kwargs, return_=result,
-                                               cost_=int(time.time() * 1000) - start_time))
-                return result
             except Exception as e:
-                if err_enable:
-                    log_.log(err_level, err_format.format(method_=func.__qualname__, args_=args, kwargs_=kwargs,
-                                                          ex_=traceback.format_exc(), ex_msg_=str(e),
-                                                          cost_=int(time.time() * 1000) - start_time))
+                _failure(args, kwargs, e, start_time)
                 raise e
+            # 日志级别未开启时不做任何格式化, 开启时交由handler输出时再格式化
+            if start_time is not None and log_.isEnabledFor(level_):
+                _success(args, kwargs, result, start_time)
+            return result
 
-        return _execute
+        _execute.log_stats = errors.snapshot
+        return extended_classmethod(_execute)
 
     return wrapper
 
@@ -122,7 +358,12 @@ def retry(ignore=False, retry_times=10, ex=Exception, interval=5,
           err_log_enable: bool = True,
           err_log_=__log,
           err_level=logging.WARNING,
-          err_format: str = '\nRecorder: @retry\nFunction/Method: {method_}\nParameters: {args_}(*args) {kwargs_}(**kwargs)\nRemainRetryTimes: {remain_retry_}\nRemainRetryInterval:{remain_retry_interval_}\nErr: {ex_}'):
+          err_format: str = '\nRecorder: @retry\nFunction/Method: {method_}\nParameters: {args_}(*args) {kwargs_}(**kwargs)\nRemainRetryTimes: {remain_retry_}\nRemainRetryInterval:{remain_retry_interval_}\nErr: {ex_}',
+          backoff=None,
+          max_interval=60,
+          multiplier=2,
+          deadline=None,
+          budget=None):
     """
     重试注解, 使用方式:
         @retry
@@ -131,86 +372,342 @@ def retry(ignore=False, retry_times=10, ex=Exception, interval=5,
     :param ignore: 是否忽略该注解
     :param retry_times: 重试次数
     :param ex: 指定异常类型(即仅只对设定的异常进行重试), 支持使用tuple or list方式设定多种异常类型
-    :param interval: 重试间隔, 单位: s
+    :param interval: 重试间隔(退避策略的基础间隔), 单位: s
     :param default_return_value: 重试后仍然失败返回的默认值，若为None则抛出最后一次重试的异常，否则返回该默认值
     :param err_log_enable: 是否开启重试日志
     :param err_log_: 日志对象(默认使用内置全局日志)
     :param err_level: 重试日志记录等级
     :param err_format: 重试日志格式化格式
+    :param backoff: 退避策略, 默认固定间隔, 可选 exponential, exponential_jitter, decorrelated_jitter 或自定义方法 f(attempt, previous) -> s
+    :param max_interval: 退避策略的最大间隔, 单位: s
+    :param multiplier: 指数退避倍数
+    :param deadline: 单次调用(含所有重试及间隔)的总耗时限制, 超出后不再重试, 单位: s
+    :param budget: 重试预算, True 使用进程内所有@retry共享的默认预算, 也可传入 RetryBudget 对象, 预算不足时放弃重试
     """
+    strategy = backoff_strategy(backoff, interval, max_interval, multiplier)
+    retry_budget = default_retry_budget if budget is True else (budget or None)
+    ex_types = tuple(ex) if isinstance(ex, (list, tuple)) else ex
 
     def wrapper(func):
+        if ignore:
+            return func
+        stats = RetryStats(_global_retry_stats)
+
+        def _next_interval(args, kwargs, e, retry_ts, attempt, previous, start_time):
+            """
+            记录一次失败, 返回下次重试前的等待时间, 返回None表示不再重试
+            """
+            sleep_interval = strategy(attempt, previous) if retry_ts > 0 else 0
+            if err_log_enable and err_log_.isEnabledFor(err_level):
+                err_log_.log(err_level, _LazyMessage(err_format, method_=func.__qualname__,
+                                                     args_=_LazyValue(args, None),
+                                                     kwargs_=_LazyValue(kwargs, None, owned=True),
+                                                     ex_=_LazyTraceback(e), ex_msg_=_LazyValue(e, None),
+                                                     remain_retry_=retry_ts, remain_retry_interval_=sleep_interval))
+            if retry_ts == 0:
+                return None
+            if deadline is not None and time.monotonic() - start_time + sleep_interval > deadline:
+                stats.increase('deadline_exceeded')
+                return None
+            if retry_budget is not None and not retry_budget.try_withdraw():
+                stats.increase('budget_rejections')
+                return None
+            stats.increase('retries')
+            return sleep_interval
+
+        def _give_up(latest_err):
+            stats.increase('failures')
+            if default_return_value is None:
+                raise latest_err
+            return default_return_value
+
+        if inspect.iscoroutinefunction(func):
+            # 仅协程方法需要asyncio, 在装饰时导入, 避免导入本包时加载asyncio
+            import asyncio
+
+            @functools.wraps(func)
+            async def _async_execute(*args, **kwargs):
+                if retry_budget is not None:
+                    retry_budget.deposit()
+                stats.increase('calls')
+                start_time = time.monotonic() if deadline is not None else 0
+                retry_ts = retry_times
+                attempt = 0
+                sleep_interval = interval
+                while True:
+                    try:
+                        result = await func(*args, **kwargs)
+                    except Exception as e:
+                        if not isinstance(e, ex_types):
+                            raise e
+                        sleep_interval = _next_interval(args, kwargs, e, retry_ts, attempt, sleep_interval,
+                                                        start_time)
+                        if sleep_interval is None:
+                            return _give_up(e)
+                        retry_ts -= 1
+                        attempt += 1
+                        await asyncio.sleep(sleep_interval)
+                        continue
+                    if attempt:
+                        stats.increase('successes_after_retry')
+                    return result
+
+            _async_execute.retry_stats = stats
+            return extended_classmethod(_async_execute)
 
         @functools.wraps(func)
-        @extended_ignore(ignore, func)
-        @extended_classmethod
         def _execute(*args, **kwargs):
-            def ex_retry_check(exc, e_type):
-                if isinstance(exc, list) or isinstance(exc, tuple):
-                    for e in exc:
-                        if issubclass(e_type, e):
-                            return True
-                    return False
-                return issubclass(e_type, exc)
-
+            if retry_budget is not None:
+                retry_budget.deposit()
+            stats.increase('calls')
+            start_time = time.monotonic() if deadline is not None else 0
             retry_ts = retry_times
-            latest_err = None
-            while retry_ts >= 0:
+            attempt = 0
+            sleep_interval = interval
+            while True:
                 try:
-                    return func(*args, **kwargs)
+                    result = func(*args, **kwargs)
                 except Exception as e:
-                    latest_err = e
-                    if ex_retry_check(ex, type(e)):
-                        if err_log_enable:
-                            err_log_.log(err_level, err_format.format(method_=func.__qualname__, args_=args, kwargs_=kwargs,
-                                                                      ex_=traceback.format_exc(), ex_msg_=str(e),
-                                                                      remain_retry_=retry_ts,
-                                                                      remain_retry_interval_=interval))
-                        retry_ts -= 1
-                        time.sleep(interval)
-                    else:
+                    if not isinstance(e, ex_types):
                         raise e
-            if default_return_value is None:
-                raise latest_err
-            return default_return_value
+                    sleep_interval = _next_interval(args, kwargs, e, retry_ts, attempt, sleep_interval, start_time)
+                    if sleep_interval is None:
+                        return _give_up(e)
+                    retry_ts -= 1
+                    attempt += 1
+                    # 所在的 @parallel/@timeout 调用被取消时不再重试
+                    token = current_token()
+                    if token.wait(sleep_interval):
+                        raise token.error
+                    continue
+                if attempt:
+                    stats.increase('successes_after_retry')
+                return result
 
-        return _execute
+        _execute.retry_stats = stats
+        return extended_classmethod(_execute)
 
     return wrapper
 
 
 @annotation
 @extended_annotation
-def parallel(ignore=False, pool: Executor = None):
+def parallel(ignore=False, pool=None, concurrency=None, policy=POLICY_BLOCK, mode=MODE_THREAD,
+             shared_memory_threshold=DEFAULT_SHARED_MEMORY_THRESHOLD, timeout=None):
     """
     并行, 使用方式:
         @parallel
         def f():
             pass
     :param ignore: 是否忽略该注解
-    :param pool: 当前仅支持concurrent.futures.ThreadPoolExecutor线程池, 若不传该值默认新建线程运行
-    :return
+    :param pool: 执行的线程池, 支持 concurrent.futures.Executor 对象或命名线程池名称(见 get_pool),
+                 若不传该值使用进程内共享的默认有界线程池; 在 @parallel 任务中调用同一线程池的 @parallel 方法(嵌套并行)时,
+                 有空闲(或可新建)的工作线程则并行执行, 线程池已饱和时子任务直接在当前工作线程中执行(返回已完成的 SimpleFuture)
+    :param concurrency: 该方法的最大并发数(含排队中的任务), 为None时不限制
+    :param policy: 达到最大并发数时的处理策略, block: 阻塞调用线程, reject: 抛出 PoolRejectedError, caller_runs: 在调用线程中直接执行
+    :param mode: 运行模式, thread: 线程池运行, process: 进程池运行(适用于CPU密集型任务, 仅支持模块级方法及类方法,
+                 pool 可传入 ProcessPoolExecutor, 不传时使用进程内共享的进程池)
+    :param shared_memory_threshold: 进程模式下, 大于该字节数的 bytes/bytearray/numpy.ndarray 参数通过共享内存传递, None 表示不使用共享内存
+    :param timeout: 单次调用超时时间(含排队时间), 单位: s, 超时后 SimpleFuture 以 CallTimeoutError(内置 TimeoutError 的子类)完成, 排队中的任务移出队列,
+                    执行中的任务通过取消令牌通知(见 current_token); None 表示不限制
+    :return 普通方法返回 SimpleFuture(可通过 cancel() 取消); 协程方法在事件循环中调用时返回 asyncio.Task, 在事件循环外调用时返回 SimpleFuture
     """
+    check_policy(policy)
+    if mode not in (MODE_THREAD, MODE_PROCESS):
+        raise ValueError(f'unsupported parallel mode: {mode}')
+    if mode == MODE_PROCESS and pool is not None and not isinstance(pool, Executor):
+        raise ValueError('parallel process mode only supports an Executor pool')
 
     def wrapper(func):
+        if ignore:
+            return func
+        if inspect.iscoroutinefunction(func):
+            return extended_classmethod(_async_parallel(func, pool, concurrency, policy, timeout))
+        limiter = threading.BoundedSemaphore(concurrency) if concurrency else None
+        if mode == MODE_PROCESS:
+            register_process_target(func)
+
+        def _executor():
+            if mode == MODE_PROCESS:
+                return pool or get_process_pool()
+            return pool if isinstance(pool, Executor) else get_pool(pool or DEFAULT_POOL)
+
+        def _submit(args, kwargs, token):
+            if mode == MODE_PROCESS:
+                # 取消令牌无法传递至子进程, 仅用于取消排队中的任务
+                return submit_process(_executor(), func, args, kwargs, shared_memory_threshold)
+            return _executor().submit(run_with_token, token, func, args, kwargs)
+
+        def _map(iterable, chunksize=1, ordered=True, max_pending=None):
+            """
+            批量并行执行 func(item), 以生成器方式返回结果:
+            输入按 chunksize 切分, 每块作为一个任务提交, 同时进行中的任务数不超过 max_pending, 内存占用有界(支持无限输入)
+            :param iterable: 输入, 每个元素作为func的唯一参数
+            :param chunksize: 每个任务处理的元素个数
+            :param ordered: 是否按输入顺序返回结果, False 时按完成顺序返回(延迟最低)
+            :param max_pending: 最大进行中任务数, 默认为线程池(进程池)工作线程数的2倍
+            """
+            executor = _executor()
+            if max_pending is None:
+                max_pending = 2 * (getattr(executor, 'max_workers', None) or getattr(executor, '_max_workers', None)
+                                   or os.cpu_count() or 1)
+            if mode == MODE_PROCESS:
+                submit_chunk = functools.partial(executor.submit, map_by_name, func.__module__, func.__qualname__)
+            else:
+                submit_chunk = functools.partial(executor.submit, _run_chunk, func)
+            items = iter(iterable)
+            pending = collections.deque()
+            try:
+                while True:
+                    chunk = list(itertools.islice(items, chunksize))
+                    if not chunk:
+                        break
+                    pending.append(submit_chunk(chunk))
+                    while len(pending) >= max_pending:
+                        yield from _next_results(pending, ordered)
+                while pending:
+                    yield from _next_results(pending, ordered)
+            finally:
+                for future in pending:
+                    future.cancel()
+
         @functools.wraps(func)
-        @extended_ignore(ignore, func)
-        @extended_classmethod
         def _execute(*args, **kwargs) -> SimpleFuture:
-            if pool is None:
-                t = SimpleThread(func, *args, **kwargs)
-                t.start()
-                return SimpleFuture(thread=t)
-            return SimpleFuture(future=pool.submit(func, *args, **kwargs))
+            # 在 @parallel 任务中提交的任务随上级任务一同取消
+            token = CancellationToken(timeout, current_token())
+            if limiter is None:
+                future = _submit(args, kwargs, token)
+            elif not limiter.acquire(blocking=policy == POLICY_BLOCK):
+                if policy == POLICY_REJECT:
+                    raise PoolRejectedError(f'{func.__qualname__} reached max concurrency: {concurrency}')
+                return SimpleFuture(future=run_inline(run_with_token, token, func, args, kwargs), token=token)
+            else:
+                try:
+                    future = _submit(args, kwargs, token)
+                except BaseException:
+                    limiter.release()
+                    raise
+                future.add_done_callback(lambda _: limiter.release())
+            if timeout is not None:
+                future = _with_deadline(future, token, func.__qualname__, timeout)
+            return SimpleFuture(future=future, token=token)
 
-        return _execute
+        _execute.map = _map
+        return extended_classmethod(_execute)
 
     return wrapper
 
 
+def _with_deadline(future: Future, token: CancellationToken, name, timeout) -> Future:
+    """
+    返回在截止时间前与 future 结果一致的新 Future, 到期未完成时以 CallTimeoutError 完成并取消原任务;
+    新 Future 被取消时同时取消原任务
+    """
+    target = Future()
+
+    def _expire():
+        error = CallTimeoutError(f'{name} timed out after {timeout}s')
+        # 先以 CallTimeoutError 完成, 取消排队中的原任务时触发的 _done 不再改变结果
+        _settle(target, error, True)
+        token.cancel(error)
+        future.cancel()
+
+    entry = deadline_scheduler.schedule(token.deadline, _expire)
+
+    def _done(f):
+        deadline_scheduler.cancel(entry)
+        if f.cancelled():
+            target.cancel()
+        elif f.exception() is not None:
+            _settle(target, f.exception(), True)
+        else:
+            _settle(target, f.result(), False)
+
+    def _target_done(t):
+        if t.cancelled():
+            deadline_scheduler.cancel(entry)
+            token.cancel()
+            future.cancel()
+
+    future.add_done_callback(_done)
+    target.add_done_callback(_target_done)
+    return target
+
+
+def _settle(future: Future, value, error):
+    """
+    未完成时设置结果或异常, 已完成(或已取消)时忽略(截止回调与完成回调可能并发)
+    """
+    try:
+        if error:
+            future.set_exception(value)
+        else:
+            future.set_result(value)
+    except concurrent.futures.InvalidStateError:
+        pass
+
+
+def _async_parallel(func, pool, concurrency, policy, timeout):
+    """
+    协程方法的@parallel: 有运行中的事件循环时创建Task调度至该循环(不阻塞事件循环), 返回 asyncio.Task;
+    无运行中的事件循环时提交至线程池以 asyncio.run 运行, 返回 SimpleFuture.
+    设置 concurrency 时通过(每个事件循环一个)asyncio.Semaphore 限制并发, 设置 timeout 时通过 asyncio.wait_for 限制耗时(含排队时间)
+    """
+    import asyncio
+
+    # 事件循环 -> [asyncio.Semaphore, 已提交未完成的任务数]
+    limits = weakref.WeakKeyDictionary()
+
+    def _deadline(coro):
+        return coro if timeout is None else wait_for(coro, timeout, func.__qualname__)
+
+    async def _limited(semaphore, args, kwargs):
+        async with semaphore:
+            return await func(*args, **kwargs)
+
+    @functools.wraps(func)
+    def _execute(*args, **kwargs):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            executor = pool if isinstance(pool, Executor) else get_pool(pool or DEFAULT_POOL)
+            return SimpleFuture(future=executor.submit(asyncio.run, _deadline(func(*args, **kwargs))))
+        if not concurrency:
+            return loop.create_task(_deadline(func(*args, **kwargs)))
+        limit = limits.get(loop)
+        if limit is None:
+            limit = limits[loop] = [asyncio.Semaphore(concurrency), 0]
+        if policy == POLICY_REJECT and limit[1] >= concurrency:
+            raise PoolRejectedError(f'{func.__qualname__} reached max concurrency: {concurrency}')
+        limit[1] += 1
+        task = loop.create_task(_deadline(_limited(limit[0], args, kwargs)))
+        task.add_done_callback(lambda _: limit.__setitem__(1, limit[1] - 1))
+        return task
+
+    return _execute
+
+
+def _run_chunk(func, chunk):
+    return [func(item) for item in chunk]
+
+
+def _next_results(pending: collections.deque, ordered):
+    """
+    取出下一个(ordered)或最先(unordered)完成的任务结果
+    """
+    if ordered:
+        return pending.popleft().result()
+    done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+    results = []
+    for future in done:
+        pending.remove(future)
+        results.extend(future.result())
+    return results
+
+
 class SimpleThread(threading.Thread):
     """
-    简单线程对象(可获取返回结果)
+    简单线程对象(可获取返回结果), 执行完成后通过内部future通知等待方
     """
 
     def __init__(self, func, *args, **kwargs):
@@ -221,14 +718,21 @@ class SimpleThread(threading.Thread):
         self.result = None
         self.exception = None
         self.finish = 0
+        self.future = Future()
 
     def run(self):
+        if not self.future.set_running_or_notify_cancel():
+            return
         try:
             self.result = self.func(*self.args, **self.kwargs)
         except Exception as e:
             self.exception = e
         finally:
             self.finish = 1
+            if self.exception is not None:
+                self.future.set_exception(self.exception)
+            else:
+                self.future.set_result(self.result)
 
     def is_done(self):
         return self.finish == 1
@@ -241,29 +745,120 @@ class SimpleThread(threading.Thread):
 
 class SimpleFuture:
     """
-    简单future
+    简单future, 线程及线程池/进程池运行的结果统一由 concurrent.futures.Future 承载, 等待时无需轮询
     """
-    __default_wait_interval = 0.001
 
-    def __init__(self, thread=None, future=None):
+    def __init__(self, thread=None, future=None, token=None):
         self.__thread = thread
-        self.__future = future
+        self.__future = future if future is not None else thread.future
+        self.__token = token
+
+    @property
+    def future(self) -> Future:
+        """
+        实际承载结果的 concurrent.futures.Future
+        """
+        return self.__future
+
+    @property
+    def token(self) -> CancellationToken:
+        """
+        任务的取消令牌(@parallel 线程模式), 无令牌时为None
+        """
+        return self.__token
 
     def is_done(self):
-        if self.__thread is not None:
-            return self.__thread.is_done()
         return self.__future.done()
 
+    def cancel(self) -> bool:
+        """
+        取消任务: 排队中的任务直接移出队列; 执行中的任务通过取消令牌通知, 需方法内通过 current_token() 检查并自行退出
+        :return 是否已取消(之后 get() 抛出 CancelledError), 执行中(未设置 timeout)或已完成的任务返回False
+        """
+        if self.__token is not None and not self.__future.done():
+            self.__token.cancel()
+        return self.__future.cancel()
+
+    def cancelled(self) -> bool:
+        return self.__future.cancelled()
+
     def get(self, timeout=None):
-        if self.__thread is not None:
-            if timeout is not None:
-                begin_time = int(time.time())
-                cur_time = int(time.time())
-            while not self.is_done():
-                time.sleep(self.__default_wait_interval)
-                if timeout is not None:
-                    cur_time += self.__default_wait_interval
-                    if cur_time - begin_time >= timeout:
-                        raise Exception(f'SimpleFuture: {self} wait timeout: {timeout} s')
-            return self.__thread.get()
+        """
+        等待并获取结果
+        :param timeout: 超时时间, 单位: s, 超时抛出 TimeoutError
+        """
         return self.__future.result(timeout=timeout)
+
+    def exception(self, timeout=None):
+        """
+        等待并获取异常, 正常完成时返回None
+        """
+        return self.__future.exception(timeout=timeout)
+
+    def add_done_callback(self, fn):
+        """
+        添加完成回调 fn(simple_future), 已完成时立即在当前线程调用
+        """
+        self.__future.add_done_callback(lambda _: fn(self))
+
+    def then(self, fn) -> 'SimpleFuture':
+        """
+        链式处理: 完成后以结果调用 fn(result), 返回承载 fn 返回值的新 SimpleFuture, 原future异常时直接传递异常
+        """
+        target = Future()
+        target.set_running_or_notify_cancel()
+
+        def _callback(future):
+            try:
+                target.set_result(fn(future.get()))
+            except Exception as e:
+                target.set_exception(e)
+
+        self.add_done_callback(_callback)
+        return SimpleFuture(future=target)
+
+
+def _simple_futures(futures):
+    return [f if isinstance(f, SimpleFuture) else SimpleFuture(future=f) for f in futures]
+
+
+def wait_all(futures, timeout=None) -> list:
+    """
+    等待全部完成并按顺序返回结果, 任一异常时抛出(按顺序第一个)异常
+    :param futures: SimpleFuture 或 concurrent.futures.Future 列表
+    :param timeout: 总超时时间, 单位: s, 超时抛出 TimeoutError
+    """
+    futures = _simple_futures(futures)
+    _, not_done = concurrent.futures.wait([f.future for f in futures], timeout=timeout)
+    if not_done:
+        raise concurrent.futures.TimeoutError(f'{len(not_done)} (of {len(futures)}) futures unfinished')
+    return [f.get() for f in futures]
+
+
+def wait_any(futures, timeout=None) -> SimpleFuture:
+    """
+    等待任一完成, 返回最先完成的 SimpleFuture
+    :param futures: SimpleFuture 或 concurrent.futures.Future 列表
+    :param timeout: 超时时间, 单位: s, 超时抛出 TimeoutError
+    """
+    futures = _simple_futures(futures)
+    mapping = {f.future: f for f in futures}
+    done, _ = concurrent.futures.wait(mapping, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+    if not done:
+        raise concurrent.futures.TimeoutError(f'none of {len(futures)} futures finished')
+    for f in futures:
+        if f.future in done:
+            return f
+
+
+def as_completed(futures, timeout=None):
+    """
+    按完成顺序依次返回 SimpleFuture 的生成器
+    :param futures: SimpleFuture 或 concurrent.futures.Future 列表
+    :param timeout: 总超时时间, 单位: s, 超时抛出 TimeoutError
+    """
+    mapping = {}
+    for f in _simple_futures(futures):
+        mapping.setdefault(f.future, []).append(f)
+    for future in concurrent.futures.as_completed(mapping, timeout=timeout):
+        yield from mapping[future]
@@ -0,0 +1,290 @@
+import atexit
+import os
+import queue
+import threading
+from concurrent.futures import Executor, Future
+
+from .._fork import after_fork_in_child, register_instance
+from .cancel import is_abandoned
+
+POLICY_BLOCK = 'block'
+POLICY_REJECT = 'reject'
+POLICY_CALLER_RUNS = 'caller_runs'
+_POLICIES = (POLICY_BLOCK, POLICY_REJECT, POLICY_CALLER_RUNS)
+
+DEFAULT_POOL = 'default'
+_ENV_PREFIX = 'parallel.'
+
+# 当前线程所属的 BoundedThreadPool(工作线程中为所在线程池)
+_worker = threading.local()
+
+
+class PoolRejectedError(RuntimeError):
+    """
+    线程池队列已满(或已达到并发上限), 任务被拒绝
+    """
+
+
+def run_inline(fn, *args, **kwargs) -> Future:
+    """
+    在当前线程执行并返回已完成的 Future
+    """
+    future = Future()
+    future.set_running_or_notify_cancel()
+    try:
+        future.set_result(fn(*args, **kwargs))
+    except BaseException as e:
+        future.set_exception(e)
+    return future
+
+
+def check_policy(policy):
+    if policy not in _POLICIES:
+        raise ValueError(f'unsupported policy: {policy}, available: {_POLICIES}')
+    return policy
+
+
+class _WorkQueue(queue.Queue):
+    """
+    任务队列, 额外记录阻塞在 take() 上的工作线程数(与队列长度在同一把锁内更新)
+    """
+
+    def _init(self, maxsize):
+        super()._init(maxsize)
+        self.waiting = 0
+
+    def take(self):
+        """
+        工作线程取出任务, 队列为空时阻塞
+        """
+        with self.not_empty:
+            self.waiting += 1
+            while not self._qsize():
+                self.not_empty.wait()
+            self.waiting -= 1
+            item = self._get()
+            self.not_full.notify()
+            return item
+
+    def put_if_waiting(self, item) -> bool:
+        """
+        等待中的工作线程数多于队列中的任务数时放入任务并返回 True(任务会被立即取出执行), 否则返回 False
+        """
+        with self.not_full:
+            if self.waiting <= self._qsize():
+                return False
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+            return True
+
+
+class BoundedThreadPool(Executor):
+    """
+    有界线程池: 工作线程按需创建且数量有上限, 任务队列有界, 队列满时按策略处理
+    (block: 阻塞提交线程, reject: 抛出 PoolRejectedError, caller_runs: 在提交线程中直接执行).
+    工作线程向所在线程池提交任务(嵌套并行)时, 有空闲(或可新建)的工作线程则排队执行, 线程池已饱和时直接在该工作线程中执行,
+    避免所有工作线程都在等待排队中的子任务而死锁
+    """
+
+    def __init__(self, max_workers=None, queue_size=None, policy=POLICY_BLOCK, name=DEFAULT_POOL):
+        """
+        :param max_workers: 最大工作线程数, 默认 min(32, cpu核数 + 4)
+        :param queue_size: 任务队列长度, 默认 max_workers * 64
+        :param policy: 队列满时的处理策略 block/reject/caller_runs
+        :param name: 线程池名称(工作线程名前缀)
+        """
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.queue_size = queue_size if queue_size is not None else self.max_workers * 64
+        self.policy = check_policy(policy)
+        self.name = name
+        self.__queue = _WorkQueue(self.queue_size)
+        self.__threads = []
+        self.__idle = threading.Semaphore(0)
+        self.__lock = threading.Lock()
+        self.__shutdown = False
+        self.__active = 0
+        self.__counters = {'submitted': 0, 'completed': 0, 'rejected': 0, 'caller_runs': 0, 'nested_runs': 0}
+        register_instance(self)
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        if self.__shutdown:
+            raise RuntimeError(f'cannot schedule new futures after shutdown: {self.name}')
+        future = Future()
+        item = (future, fn, args, kwargs)
+        if getattr(_worker, 'pool', None) is self:
+            if self.__submit_nested(item):
+                return future
+            return run_inline(fn, *args, **kwargs)
+        self.__adjust_workers()
+        if self.policy == POLICY_BLOCK:
+            self.__queue.put(item)
+        else:
+            try:
+                self.__queue.put_nowait(item)
+            except queue.Full:
+                if self.policy == POLICY_REJECT:
+                    self.__increase('rejected')
+                    raise PoolRejectedError(f'pool {self.name} queue is full: {self.queue_size}')
+                self.__increase('caller_runs')
+                return run_inline(fn, *args, **kwargs)
+        self.__increase('submitted')
+        return future
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        with self.__lock:
+            if self.__shutdown:
+                threads = []
+            else:
+                self.__shutdown = True
+                threads = list(self.__threads)
+            if cancel_futures:
+                while True:
+                    try:
+                        item = self.__queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not None:
+                        item[0].cancel()
+        for _ in threads:
+            self.__queue.put(None)
+        if wait:
+            for t in threads:
+                # 执行已取消(超时)调用的线程可能一直阻塞, 不再等待
+                while t.is_alive() and not is_abandoned(t):
+                    t.join(0.1)
+
+    def metrics(self) -> dict:
+        """
+        线程池指标: queue_depth: 队列中等待的任务数, active_workers: 正在执行任务的线程数, workers: 工作线程数,
+        submitted/completed/rejected/caller_runs: 累计提交/完成/拒绝/提交线程执行的任务数,
+        nested_runs: 工作线程向所在线程池提交时线程池已饱和, 直接在该工作线程中执行的任务数
+        """
+        with self.__lock:
+            metrics = dict(self.__counters)
+            metrics.update(name=self.name, queue_depth=self.__queue.qsize(), active_workers=self.__active,
+                           workers=len(self.__threads), max_workers=self.max_workers, queue_size=self.queue_size)
+        return metrics
+
+    def _after_fork(self):
+        """
+        fork 出的子进程中只有调用 fork 的线程, 重置工作线程状态(之后按需重新创建), 父进程排队中的任务不在子进程执行
+        """
+        self.__queue = _WorkQueue(self.queue_size)
+        self.__threads = []
+        self.__idle = threading.Semaphore(0)
+        self.__lock = threading.Lock()
+        self.__active = 0
+
+    def __increase(self, field):
+        with self.__lock:
+            self.__counters[field] += 1
+
+    def __submit_nested(self, item) -> bool:
+        """
+        工作线程提交的任务: 有空闲工作线程(或可新建工作线程)时排队并返回 True, 否则返回 False 由当前线程执行
+        """
+        with self.__lock:
+            if not self.__queue.put_if_waiting(item):
+                if len(self.__threads) >= self.max_workers or self.__shutdown:
+                    self.__counters['nested_runs'] += 1
+                    return False
+                try:
+                    self.__queue.put_nowait(item)
+                except queue.Full:
+                    self.__counters['nested_runs'] += 1
+                    return False
+                self.__start_worker()
+            self.__counters['submitted'] += 1
+        return True
+
+    def __adjust_workers(self):
+        if self.__idle.acquire(blocking=False):
+            return
+        with self.__lock:
+            if len(self.__threads) < self.max_workers and not self.__shutdown:
+                self.__start_worker()
+
+    def __start_worker(self):
+        # 调用方已持有 __lock
+        t = threading.Thread(target=self.__work, name=f'sp_tools-{self.name}-{len(self.__threads)}', daemon=True)
+        t.start()
+        self.__threads.append(t)
+
+    def __work(self):
+        _worker.pool = self
+        q = self.__queue
+        while True:
+            item = q.take()
+            if item is None:
+                return
+            future, fn, args, kwargs = item
+            if future.set_running_or_notify_cancel():
+                with self.__lock:
+                    self.__active += 1
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+                finally:
+                    with self.__lock:
+                        self.__active -= 1
+                        self.__counters['completed'] += 1
+            del item, future, fn, args, kwargs
+            self.__idle.release()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name=DEFAULT_POOL, max_workers=None, queue_size=None, policy=None) -> BoundedThreadPool:
+    """
+    获取(首次调用时创建)命名线程池, 进程退出时自动关闭.
+    未传入的参数从环境变量 parallel.{name}.maxWorkers / parallel.{name}.queueSize / parallel.{name}.policy 读取
+    :param name: 线程池名称, 默认线程池为 default
+    :param max_workers: 最大工作线程数, 默认 min(32, cpu核数 + 4)
+    :param queue_size: 任务队列长度, 默认 max_workers * 64
+    :param policy: 队列满时的处理策略 block/reject/caller_runs, 默认 block
+    """
+    pool = _pools.get(name)
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            prefix = _ENV_PREFIX + name
+            if max_workers is None and os.environ.get(prefix + '.maxWorkers'):
+                max_workers = int(os.environ[prefix + '.maxWorkers'])
+            if queue_size is None and os.environ.get(prefix + '.queueSize'):
+                queue_size = int(os.environ[prefix + '.queueSize'])
+            if policy is None:
+                policy = os.environ.get(prefix + '.policy', POLICY_BLOCK)
+            pool = BoundedThreadPool(max_workers, queue_size, policy, name)
+            if not _pools:
+                atexit.register(_shutdown_pools)
+            _pools[name] = pool
+    return pool
+
+
+def get_pool_metrics() -> dict:
+    """
+    获取所有命名线程池的指标
+    """
+    return {name: pool.metrics() for name, pool in list(_pools.items())}
+
+
+def _shutdown_pools():
+    """
+    进程退出时关闭所有命名线程池, 等待执行中的任务完成(已被 @parallel/@timeout 放弃的任务除外)
+    """
+    for pool in list(_pools.values()):
+        pool.shutdown(wait=True)
+
+
+@after_fork_in_child
+def _reset_after_fork():
+    global _pools_lock
+    _pools_lock = threading.Lock()
+    # 调用 fork 的线程在子进程中不再是工作线程
+    _worker.pool = None
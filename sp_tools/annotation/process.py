@@ -0,0 +1,190 @@
+import atexit
+import importlib
+import os
+import sys
+import threading
+from concurrent.futures import Executor, Future
+
+from .._fork import after_fork_in_child
+
+MODE_THREAD = 'thread'
+MODE_PROCESS = 'process'
+
+# 大于该字节数的 bytes/bytearray/numpy.ndarray 参数通过共享内存传递
+DEFAULT_SHARED_MEMORY_THRESHOLD = 1024 * 1024
+
+_ENV_MAX_WORKERS = 'parallel.process.maxWorkers'
+
+# (模块名, 限定名) -> 被@parallel(mode='process')装饰的原始方法
+_targets = {}
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def register(func):
+    """
+    登记原始方法, 子进程导入同一模块时装饰器会再次登记, 从而可按限定名找回原始方法(装饰后的方法无法被pickle)
+    """
+    _targets[(func.__module__, func.__qualname__)] = func
+
+
+def _resolve(module, qualname):
+    func = _targets.get((module, qualname))
+    if func is None:
+        if module == '__main__':
+            # spawn 方式启动的子进程中主模块名为 __mp_main__
+            func = _targets.get(('__mp_main__', qualname))
+        else:
+            importlib.import_module(module)
+            func = _targets.get((module, qualname))
+    if func is None:
+        raise LookupError(f'@parallel(mode="process") target not found: {module}.{qualname}, '
+                          f'only module level functions or methods are supported')
+    return func
+
+
+class _SharedArg:
+    """
+    通过共享内存传递的参数描述(仅传递名称及元数据)
+    """
+    __slots__ = ('name', 'kind', 'size', 'shape', 'dtype')
+
+    def __init__(self, name, kind, size, shape=None, dtype=None):
+        self.name = name
+        self.kind = kind
+        self.size = size
+        self.shape = shape
+        self.dtype = dtype
+
+    def __getstate__(self):
+        return self.name, self.kind, self.size, self.shape, self.dtype
+
+    def __setstate__(self, state):
+        self.name, self.kind, self.size, self.shape, self.dtype = state
+
+
+def _share(value, threshold, segments):
+    if isinstance(value, (bytes, bytearray)):
+        if len(value) < threshold:
+            return value
+        from multiprocessing import shared_memory
+        shm = shared_memory.SharedMemory(create=True, size=len(value))
+        shm.buf[:len(value)] = value
+        segments.append(shm)
+        return _SharedArg(shm.name, type(value).__name__, len(value))
+    numpy = sys.modules.get('numpy')
+    if numpy is not None and isinstance(value, numpy.ndarray) and value.nbytes >= threshold \
+            and not value.dtype.hasobject:
+        from multiprocessing import shared_memory
+        shm = shared_memory.SharedMemory(create=True, size=value.nbytes)
+        numpy.ndarray(value.shape, value.dtype, buffer=shm.buf)[...] = value
+        segments.append(shm)
+        return _SharedArg(shm.name, 'ndarray', value.nbytes, value.shape, value.dtype.str)
+    return value
+
+
+def _attach(value, segments):
+    if not isinstance(value, _SharedArg):
+        return value
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(name=value.name)
+    if value.kind == 'ndarray':
+        import numpy
+        segments.append(shm)
+        array = numpy.ndarray(value.shape, numpy.dtype(value.dtype), buffer=shm.buf)
+        array.flags.writeable = False
+        return array
+    data = shm.buf[:value.size]
+    try:
+        return bytearray(data) if value.kind == 'bytearray' else bytes(data)
+    finally:
+        data.release()
+        shm.close()
+
+
+def call_by_name(module, qualname, args, kwargs):
+    """
+    子进程执行入口: 按限定名找回原始方法并执行, 共享内存参数在此还原
+    """
+    func = _resolve(module, qualname)
+    segments = []
+    args = tuple(_attach(arg, segments) for arg in args)
+    kwargs = {k: _attach(v, segments) for k, v in kwargs.items()}
+    try:
+        return func(*args, **kwargs)
+    finally:
+        del args, kwargs
+        for shm in segments:
+            try:
+                shm.close()
+            except BufferError:
+                # 返回值仍引用共享内存时, 由GC释放
+                pass
+
+
+def map_by_name(module, qualname, chunk):
+    """
+    子进程批量执行入口: 按限定名找回原始方法并依次处理一块输入
+    """
+    func = _resolve(module, qualname)
+    return [func(item) for item in chunk]
+
+
+def submit(executor: Executor, func, args, kwargs, threshold=DEFAULT_SHARED_MEMORY_THRESHOLD) -> Future:
+    """
+    提交至进程池: 按限定名提交原始方法, 大参数通过共享内存传递, 任务完成后释放共享内存
+    """
+    segments = []
+    if threshold is not None:
+        args = tuple(_share(arg, threshold, segments) for arg in args)
+        kwargs = {k: _share(v, threshold, segments) for k, v in kwargs.items()}
+    try:
+        future = executor.submit(call_by_name, func.__module__, func.__qualname__, args, kwargs)
+    except BaseException:
+        _release(segments)
+        raise
+    if segments:
+        future.add_done_callback(lambda _: _release(segments))
+    return future
+
+
+def _release(segments):
+    for shm in segments:
+        shm.close()
+        shm.unlink()
+
+
+def get_process_pool(max_workers=None) -> Executor:
+    """
+    获取(首次调用时创建)进程内共享的进程池, 工作进程在多次调用间复用, 进程退出时自动关闭
+    :param max_workers: 最大工作进程数, 默认读取环境变量 parallel.process.maxWorkers, 未设置时为cpu核数
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                if max_workers is None and os.environ.get(_ENV_MAX_WORKERS):
+                    max_workers = int(os.environ[_ENV_MAX_WORKERS])
+                if os.name == 'posix':
+                    # 先启动 resource_tracker, 使工作进程与当前进程共用, 避免共享内存被误报泄漏
+                    from multiprocessing import resource_tracker
+                    resource_tracker.ensure_running()
+                # 进程模式才需要, 延迟导入以减少包导入耗时
+                from concurrent.futures import ProcessPoolExecutor
+                _pool = ProcessPoolExecutor(max_workers)
+                atexit.register(_shutdown_pool, _pool, os.getpid())
+    return _pool
+
+
+def _shutdown_pool(pool, owner_pid):
+    # fork 出的子进程继承 atexit, 仅创建进程池的进程负责关闭
+    if os.getpid() == owner_pid:
+        pool.shutdown()
+
+
+@after_fork_in_child
+def _reset_after_fork():
+    # 父进程的进程池在子进程中不可用, 子进程按需重新创建
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
@@ -1,12 +1,32 @@
-def __append_project_sys_path():
-    import os, sys
-    from ..logger import get_logger
-    module_file = "__init__.py"
-    project_dir = os.path.dirname(os.path.realpath(sys.argv[0]))
-    while os.path.exists(project_dir + os.sep + module_file):
-        project_dir = os.path.dirname(project_dir)
-    get_logger().info("[autosyspath] add a sys path: %s", project_dir)
-    sys.path.append(project_dir)
-
-
-__append_project_sys_path()
+import functools
+import os
+import sys
+
+
+@functools.lru_cache(maxsize=None)
+def find_project_dir(start_dir) -> str:
+    """
+    从 start_dir 向上检索项目根路径(第一个不包含 __init__.py 的目录), 结果按 start_dir 缓存
+    """
+    project_dir = start_dir
+    while os.path.isfile(os.path.join(project_dir, '__init__.py')):
+        parent = os.path.dirname(project_dir)
+        if parent == project_dir:
+            break
+        project_dir = parent
+    return project_dir
+
+
+def add_project_sys_path() -> str:
+    """
+    将运行模块所在项目的根路径添加至 sys.path(已存在时不重复添加), 返回该路径
+    """
+    project_dir = find_project_dir(os.path.dirname(os.path.realpath(sys.argv[0])))
+    if project_dir not in sys.path:
+        from ..logger import get_logger
+        get_logger().info("[autosyspath] add a sys path: %s", project_dir)
+        sys.path.append(project_dir)
+    return project_dir
+
+
+add_project_sys_path()
@@ -1 +1 @@
-from .logger import get_logger, new_logger
+from .logger import get_logger, new_logger, dump_flight_recorder
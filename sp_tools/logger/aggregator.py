@@ -0,0 +1,180 @@
+import atexit
+import hashlib
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+from multiprocessing.connection import Client, Listener
+
+_STOP_MESSAGE = '__sp_tools_aggregator_stop__'
+_ENV_ADDRESS = 'sp_tools.logging.aggregator.address.'
+_PROCESS_NAME_PREFIX = 'sp_tools-log-aggregator-'
+_READY_TIMEOUT = 10
+
+
+class AggregatorClientHandler(logging.Handler):
+    """
+    多进程日志聚合客户端handler, 将日志序列化后发送至唯一的聚合进程, 由聚合进程统一写入文件及滚动
+    (fork出的子进程会自动重新建立连接)
+    """
+
+    def __init__(self, address, authkey: bytes):
+        super().__init__()
+        self.address = address
+        self.authkey = authkey
+        self.__conn = None
+        self.__pid = None
+
+    def _connection(self):
+        if self.__conn is None or self.__pid != os.getpid():
+            self.__conn = Client(self.address, authkey=self.authkey)
+            self.__pid = os.getpid()
+        return self.__conn
+
+    def _serialize(self, record: logging.LogRecord) -> dict:
+        """
+        仅发送已合并参数的消息及基础字段, 异常栈预先格式化为文本
+        """
+        data = dict(record.__dict__)
+        data['msg'] = record.getMessage()
+        data['args'] = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _FORMATTER.formatException(record.exc_info)
+            data['exc_text'] = record.exc_text
+        data['exc_info'] = None
+        data.pop('message', None)
+        return data
+
+    def emit(self, record):
+        try:
+            self._connection().send(self._serialize(record))
+        except Exception:
+            self.__conn = None
+            self.handleError(record)
+
+    def close(self):
+        with self.lock:
+            if self.__conn is not None and self.__pid == os.getpid():
+                self.__conn.close()
+            self.__conn = None
+        super().close()
+
+
+_FORMATTER = logging.Formatter()
+
+
+def default_address(name: str):
+    """
+    生成当前进程专属的本地通信地址(posix: unix socket, windows: named pipe)
+    """
+    suffix = '%d-%s' % (os.getpid(), hashlib.md5(name.encode('utf-8')).hexdigest()[:8])
+    if sys.platform == 'win32':
+        return r'\\.\pipe\sp_tools-log-' + suffix
+    return os.path.join(tempfile.gettempdir(), 'sp_tools-log-%s.sock' % suffix)
+
+
+def is_aggregator_process() -> bool:
+    """
+    当前进程是否为聚合进程. 以进程名判断: spawn/forkserver 启动时进程名在导入本包(反序列化进程入口)之前已设置,
+    聚合进程内的日志对象不能再连接聚合进程, 否则收到的日志会被发回自身
+    """
+    return multiprocessing.current_process().name.startswith(_PROCESS_NAME_PREFIX)
+
+
+def connect_or_start(name, address, authkey: bytes, configure, *configure_args) -> AggregatorClientHandler:
+    """
+    获取聚合进程客户端handler, 当前进程树中尚无聚合进程时启动聚合进程
+    :param name: 日志名称
+    :param address: 聚合进程地址, 为None时自动生成并通过环境变量传递给子进程
+    :param authkey: 连接认证密钥
+    :param configure: 聚合进程内创建实际写入日志对象的方法(需可被pickle)
+    """
+    env_key = _ENV_ADDRESS + name
+    inherited = os.environ.get(env_key)
+    if inherited:
+        return AggregatorClientHandler(inherited, authkey)
+    if address is not None and _reachable(address, authkey):
+        return AggregatorClientHandler(address, authkey)
+    if address is None:
+        address = default_address(name)
+    # 先写入环境变量, 保证后续 spawn/fork 的子进程均连接至同一聚合进程
+    os.environ[env_key] = address
+    ready = multiprocessing.Event()
+    process = multiprocessing.Process(target=_serve, name=_PROCESS_NAME_PREFIX + name, daemon=True,
+                                      args=(address, authkey, ready, os.getpid(), configure) + configure_args)
+    process.start()
+    if not ready.wait(_READY_TIMEOUT):
+        raise RuntimeError(f'sp_tools log aggregator for {name} did not start at {address}')
+    handler = AggregatorClientHandler(address, authkey)
+    atexit.register(_stop, os.getpid(), process, address, authkey, handler)
+    return handler
+
+
+def _reachable(address, authkey):
+    try:
+        Client(address, authkey=authkey).close()
+        return True
+    except Exception:
+        return False
+
+
+def _stop(owner_pid, process, address, authkey, handler):
+    # fork 出的子进程(如gunicorn worker)可能继承atexit, 仅启动聚合进程的进程负责停止
+    if os.getpid() != owner_pid:
+        return
+    handler.close()
+    try:
+        with Client(address, authkey=authkey) as conn:
+            conn.send(_STOP_MESSAGE)
+    except Exception:
+        pass
+    process.join(_READY_TIMEOUT)
+
+
+def _serve(address, authkey, ready, parent_pid, configure, *configure_args):
+    """
+    聚合进程入口: 接收各进程发送的日志, 统一交由本进程内的handler写入
+    """
+    logger = configure(*configure_args)
+    stop = threading.Event()
+    try:
+        listener = Listener(address, authkey=authkey)
+    except OSError:
+        # 同一地址已由其他聚合进程占用
+        ready.set()
+        return
+    threading.Thread(target=_accept, args=(listener, logger, stop), daemon=True).start()
+    ready.set()
+    while not stop.wait(1):
+        if os.getppid() != parent_pid:
+            break
+    listener.close()
+    for handler in list(logger.handlers):
+        handler.close()
+
+
+def _accept(listener, logger, stop):
+    while not stop.is_set():
+        try:
+            conn = listener.accept()
+        except Exception:
+            if stop.is_set():
+                return
+            continue
+        threading.Thread(target=_receive, args=(conn, logger, stop), daemon=True).start()
+
+
+def _receive(conn, logger, stop):
+    with conn:
+        while True:
+            try:
+                data = conn.recv()
+            except (EOFError, OSError):
+                return
+            if data == _STOP_MESSAGE:
+                stop.set()
+                return
+            logger.handle(logging.makeLogRecord(data))
@@ -0,0 +1,348 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+from .._fork import register_instance
+
+_STOP = object()
+
+POLICY_BLOCK = 'block'
+POLICY_DROP = 'drop'
+
+
+class BatchQueueHandler(logging.Handler):
+    """
+    基于内存队列的异步日志handler, 调用线程仅负责入队, 由后台写线程批量写入目标handler
+    (消息参数均为不可变基础类型时延迟至写线程格式化, 否则入队时合并参数, 输出内容为调用时的值)
+    """
+
+    def __init__(self, handlers, max_size=10000, policy=POLICY_BLOCK, batch_size=512, flush_interval=1.0):
+        """
+        :param handlers: 实际写入的handler列表
+        :param max_size: 队列最大长度
+        :param policy: 队列满时的处理策略, block: 阻塞调用线程, drop: 丢弃该条日志
+        :param batch_size: 单次批量写入的最大日志条数, 未刷盘条数达到该值时刷盘
+        :param flush_interval: 刷盘时间间隔, 单位: s
+        """
+        super().__init__()
+        if policy not in (POLICY_BLOCK, POLICY_DROP):
+            raise ValueError(f'BatchQueueHandler: unsupported policy: {policy}')
+        self.handlers = list(handlers)
+        # SimpleQueue 由C实现, 入队开销远低于 queue.Queue, 容量限制通过 qsize 判断
+        self.queue = queue.SimpleQueue()
+        self.max_size = max_size
+        self.policy = policy
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.__not_full = threading.Event()
+        self.__closed = False
+        self.__start()
+        atexit.register(self.close)
+        register_instance(self)
+
+    def __start(self):
+        self.__thread = threading.Thread(target=self._run, name='sp_tools-log-writer', daemon=True)
+        self.__thread.start()
+
+    def _before_fork(self):
+        # 子进程继承文件缓冲区, 先刷盘以免已写入缓冲区的日志被子进程重复写入
+        self._flush()
+
+    def _after_fork(self):
+        """
+        fork 出的子进程中写线程已不存在, 使用新队列重新启动写线程(父进程队列中的日志由父进程写入)
+        """
+        if self.__closed:
+            return
+        self.queue = queue.SimpleQueue()
+        self.__not_full = threading.Event()
+        self.__start()
+
+    def handle(self, record):
+        # 入队本身线程安全, 无需获取handler锁
+        rv = self.filter(record)
+        if rv:
+            self.emit(record)
+        return rv
+
+    def emit(self, record):
+        if self.__closed:
+            # 关闭后(如进程退出阶段)产生的日志直接同步写入
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+            return
+        q = self.queue
+        if q.qsize() >= self.max_size:
+            if self.policy == POLICY_DROP:
+                self.dropped += 1
+                return
+            while q.qsize() >= self.max_size and not self.__closed:
+                self.__not_full.clear()
+                self.__not_full.wait(0.1)
+        try:
+            _freeze(record)
+        except Exception:
+            self.handleError(record)
+            return
+        q.put(record)
+
+    def close(self):
+        """
+        写入队列中剩余的日志后关闭写线程及目标handler
+        """
+        if self.__closed:
+            return
+        self.__closed = True
+        self.queue.put(_STOP)
+        self.__thread.join()
+        for handler in self.handlers:
+            handler.close()
+        super().close()
+
+    def _run(self):
+        q = self.queue
+        pending = 0
+        first_pending_time = 0
+        while True:
+            try:
+                if pending:
+                    record = q.get(timeout=max(0, first_pending_time + self.flush_interval - time.monotonic()))
+                else:
+                    record = q.get()
+            except queue.Empty:
+                record = None
+            stop = record is _STOP
+            batch = []
+            if record is not None and not stop:
+                batch.append(record)
+                while len(batch) < self.batch_size:
+                    try:
+                        record = q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if record is _STOP:
+                        stop = True
+                        break
+                    batch.append(record)
+            if batch:
+                self.__not_full.set()
+                if not pending:
+                    first_pending_time = time.monotonic()
+                self._write(batch)
+                pending += len(batch)
+            if pending and (stop or pending >= self.batch_size
+                            or time.monotonic() - first_pending_time >= self.flush_interval):
+                self._flush()
+                pending = 0
+            if stop:
+                break
+
+    def _write(self, batch):
+        for handler in self.handlers:
+            if type(handler) in (logging.StreamHandler, logging.FileHandler):
+                _write_stream(handler, batch)
+            else:
+                # 滚动类等handler需逐条判断是否需要滚动
+                for record in batch:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+
+    def _flush(self):
+        for handler in self.handlers:
+            try:
+                handler.flush()
+            except Exception:
+                pass
+
+
+# 输出前不会被修改的参数类型, 此类参数延迟至输出时格式化
+_IMMUTABLE_ARGS = (str, int, float, bool, bytes, type(None))
+# 元素均不可变时视为不可变的 tuple/frozenset 的最大元素个数, 超出时直接格式化
+_MAX_IMMUTABLE_ITEMS = 16
+
+
+def _immutable(value) -> bool:
+    t = type(value)
+    if t in _IMMUTABLE_ARGS:
+        return True
+    if t is tuple or t is frozenset:
+        return len(value) <= _MAX_IMMUTABLE_ITEMS and all(_immutable(item) for item in value)
+    return False
+
+
+def _freeze(record: logging.LogRecord):
+    """
+    保存日志参数快照, 避免日志在其他线程(或缓冲后)输出时参数已被修改(或修改中的参数格式化出错):
+    参数均不可变时, 字符串消息保持延迟格式化, 支持 freeze() 的延迟消息(如@log)仅渲染其中可变的参数;
+    其他情况立即合并消息参数(同 QueueHandler.prepare)
+    """
+    args = record.args
+    if not args or isinstance(args, tuple) and all(_immutable(arg) for arg in args):
+        msg = record.msg
+        if isinstance(msg, str):
+            return
+        freeze = getattr(msg, 'freeze', None)
+        if freeze is not None:
+            record.msg = freeze(_immutable)
+            return
+    record.msg = record.getMessage()
+    record.args = None
+
+
+def _write_stream(handler: logging.StreamHandler, batch):
+    """
+    将一批日志合并为一次写入, 不立即刷盘
+    """
+    chunks = []
+    for record in batch:
+        if record.levelno >= handler.level and handler.filter(record):
+            try:
+                chunks.append(handler.format(record) + handler.terminator)
+            except Exception:
+                handler.handleError(record)
+    if not chunks:
+        return
+    with handler.lock:
+        try:
+            if handler.stream is None and isinstance(handler, logging.FileHandler):
+                handler.stream = handler._open()
+            handler.stream.write(''.join(chunks))
+        except Exception:
+            handler.handleError(batch[-1])
+
+
+SCOPE_THREAD = 'thread'
+SCOPE_PROCESS = 'process'
+# 缓冲区数量上限, 避免频繁创建线程时缓冲区持续增长
+_MAX_BUFFERS = 1024
+
+
+class _RingBuffer:
+    """
+    预分配的环形缓冲区, 仅保存最近 capacity 条日志(捕获时仅合并可变参数, 不做格式化)
+    """
+    __slots__ = ('records', 'position')
+
+    def __init__(self, capacity):
+        self.records = [None] * capacity
+        self.position = 0
+
+    def append(self, record):
+        records = self.records
+        records[self.position % len(records)] = record
+        self.position += 1
+
+    def drain(self) -> list:
+        """
+        按写入顺序取出缓冲区中的日志并清空
+        """
+        records = self.records
+        capacity = len(records)
+        end = self.position
+        drained = [records[i % capacity] for i in range(max(0, end - capacity), end)]
+        self.records = [None] * capacity
+        self.position = 0
+        return drained
+
+
+class _DumpRequest:
+    """
+    经异步队列转发至飞行记录器的主动写入请求, 保证请求之前入队的日志已进入缓冲区后再写入
+    """
+    levelno = sys.maxsize
+    msg = ''
+    args = None
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class FlightRecorderHandler(logging.Handler):
+    """
+    飞行记录器handler: 低于 threshold 级别的日志不写入目标handler, 仅保存在内存环形缓冲区(按线程或进程区分)中,
+    出现 dump_level 及以上级别的日志时先将对应缓冲区中的日志写入目标handler(不受目标handler级别限制), 也可调用 dump() 主动写入,
+    正常运行时仅有内存写入开销, 出错时可获得完整的上下文日志
+    """
+
+    def __init__(self, handlers, threshold=logging.WARNING, capacity=1000, scope=SCOPE_THREAD,
+                 dump_level=logging.ERROR):
+        """
+        :param handlers: 实际写入的handler列表
+        :param threshold: 直接写入目标handler的最低级别, 低于该级别的日志仅保存在缓冲区
+        :param capacity: 每个缓冲区保存的最近日志条数
+        :param scope: 缓冲区范围, thread: 每个线程一个缓冲区(出错时仅写入出错线程的上下文), process: 每个进程一个缓冲区
+        :param dump_level: 触发写入缓冲区的最低级别
+        """
+        super().__init__()
+        if scope not in (SCOPE_THREAD, SCOPE_PROCESS):
+            raise ValueError(f'FlightRecorderHandler: unsupported scope: {scope}')
+        self.handlers = list(handlers)
+        self.threshold = threshold
+        self.capacity = max(1, capacity)
+        self.scope = scope
+        self.dump_level = dump_level
+        # (进程id, 线程id) 或 进程id -> 缓冲区, 使用日志自身记录的进程/线程id, 经异步队列或聚合进程转发后仍可区分
+        self.__buffers = {}
+
+    def emit(self, record):
+        # Handler.handle 已持有handler锁
+        if record.levelno < self.threshold:
+            # 缓冲期间参数可能被修改, 写入的应为调用时的值
+            _freeze(record)
+            key = (record.process, record.thread) if self.scope == SCOPE_THREAD else record.process
+            buffers = self.__buffers
+            buffer = buffers.get(key)
+            if buffer is None:
+                if len(buffers) >= _MAX_BUFFERS:
+                    # 丢弃最早创建的缓冲区(通常属于已结束的线程)
+                    del buffers[next(iter(buffers))]
+                buffer = buffers[key] = _RingBuffer(self.capacity)
+            buffer.append(record)
+            return
+        if record.levelno >= self.dump_level:
+            if isinstance(record, _DumpRequest):
+                self.dump()
+                record.done.set()
+                return
+            key = (record.process, record.thread) if self.scope == SCOPE_THREAD else record.process
+            buffer = self.__buffers.pop(key, None)
+            if buffer is not None:
+                self._write(buffer.drain())
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def dump(self):
+        """
+        将所有缓冲区中的日志按时间顺序写入目标handler并清空缓冲区
+        """
+        with self.lock:
+            buffers = list(self.__buffers.values())
+            self.__buffers.clear()
+            records = [record for buffer in buffers for record in buffer.drain()]
+            records.sort(key=lambda r: r.created)
+            self._write(records)
+        self.flush()
+
+    def flush(self):
+        for handler in self.handlers:
+            try:
+                handler.flush()
+            except Exception:
+                pass
+
+    def close(self):
+        for handler in self.handlers:
+            handler.close()
+        super().close()
+
+    def _write(self, records):
+        for record in records:
+            for handler in self.handlers:
+                handler.handle(record)
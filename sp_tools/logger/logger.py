@@ -1,12 +1,22 @@
 import os
 import logging
+import threading
 import logging.handlers
 from logging import Logger
+from .handlers import BatchQueueHandler, FlightRecorderHandler, _DumpRequest
 
 _STREAM_HANDLE = 'logging.streamHandler'
 _FILE_HANDLE = 'logging.fileHandler'
 _ROTATING_FILE_HANDLE = 'logging.rotatingFileHandler'
 _TIME_ROTATING_FILE_HANDLE = 'logging.timedRotatingFileHandler'
+_QUEUE_HANDLE = 'logging.queueHandler'
+_AGGREGATOR_HANDLE = 'logging.aggregator'
+_FLIGHT_RECORDER_HANDLE = 'logging.flightRecorder'
+_DEFAULT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# 初始化完成后直接绑定至实际日志对象的方法
+_DELEGATE_METHODS = ('setLevel', 'debug', 'info', 'warning', 'error', 'exception', 'critical', 'fatal', 'log',
+                     'findCaller', 'makeRecord', 'handle', 'addHandler', 'removeHandler', 'hasHandlers',
+                     'callHandlers', 'getEffectiveLevel', 'isEnabledFor', 'getChild')
 
 
 def get_logger():
@@ -32,24 +42,192 @@ def _get_properties(properties: dict, key, default=None):
     return p
 
 
-def _log_handle_env(log_: logging.Logger, path, default_state, handler_type=logging.StreamHandler, *args, **kwargs):
-    if eval(_get_env(path + '.open', default_state)):
-        handle = handler_type(*args, **kwargs)
-        handle.setLevel(eval('logging.' + _get_env(path + '.level', 'INFO').upper()))
-        handle.setFormatter(
-            logging.Formatter(_get_env(path + '.format', '%(asctime)s - %(name)s - %(levelname)s - %(message)s')))
-        log_.addHandler(handle)
+def _parse_bool(value) -> bool:
+    """
+    安全解析布尔配置(支持 bool 及 True/False/1/0/yes/no/on/off 字符串)
+    """
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ('true', '1', 'yes', 'on'):
+        return True
+    if text in ('false', '0', 'no', 'off', ''):
+        return False
+    raise ValueError(f'invalid boolean logging config: {value!r}')
+
+
+def _parse_level(value) -> int:
+    """
+    安全解析日志级别配置(支持 int 及 DEBUG/INFO/WARNING 等级别名称)
+    """
+    if isinstance(value, int):
+        return value
+    text = str(value).strip().upper()
+    if text.isdigit():
+        return int(text)
+    level = logging.getLevelName(text)
+    if not isinstance(level, int):
+        raise ValueError(f'invalid logging level config: {value!r}')
+    return level
+
+
+class _HandlerConfig:
+    """
+    单个handler的解析后配置
+    """
+    __slots__ = ('handler_type', 'args', 'level', 'format')
+
+    def __init__(self, handler_type, args, level, format):
+        self.handler_type = handler_type
+        self.args = args
+        self.level = level
+        self.format = format
 
+    def create(self) -> logging.Handler:
+        handle = self.handler_type(*self.args)
+        handle.setLevel(self.level)
+        handle.setFormatter(logging.Formatter(self.format))
+        return handle
 
-def _log_handle_properties(log_: logging.Logger, properties: dict, path, default_state,
-                           handler_type=logging.StreamHandler, *args, **kwargs):
-    if eval(_get_properties(properties, path + '.open', default_state)):
-        handle = handler_type(*args, **kwargs)
-        handle.setLevel(eval('logging.' + _get_properties(properties, path + '.level', 'INFO').upper()))
-        handle.setFormatter(
-            logging.Formatter(
-                _get_properties(properties, path + '.format', '%(asctime)s - %(name)s - %(levelname)s - %(message)s')))
-        log_.addHandler(handle)
+
+class _LoggerConfig:
+    """
+    解析后的日志配置, 所有配置项在初始化时一次性解析校验
+    """
+
+    def __init__(self, get, file_filename, timed_rotating_filename):
+        """
+        :param get: 配置读取方法 get(key, default)
+        :param file_filename: fileHandler 默认文件路径
+        :param timed_rotating_filename: timedRotatingFileHandler 默认文件路径
+        """
+        self.level = _parse_level(get('logging.level', 'INFO'))
+        self.handlers = []
+        self._add_handler(get, _STREAM_HANDLE, 'True', logging.StreamHandler)
+        self._add_handler(get, _FILE_HANDLE, 'False', logging.FileHandler,
+                          get(_FILE_HANDLE + '.filename', file_filename),
+                          get(_FILE_HANDLE + '.mode', 'a'),
+                          get(_FILE_HANDLE + '.encoding', 'utf-8'),
+                          _parse_bool(get(_FILE_HANDLE + '.delay', 'False')))
+        self._add_handler(get, _ROTATING_FILE_HANDLE, 'False', logging.handlers.RotatingFileHandler,
+                          get(_ROTATING_FILE_HANDLE + '.filename', './rotating.log'),
+                          get(_ROTATING_FILE_HANDLE + '.mode', 'a'),
+                          int(get(_ROTATING_FILE_HANDLE + '.maxBytes', 0)),
+                          int(get(_ROTATING_FILE_HANDLE + '.backupCount', 0)),
+                          get(_ROTATING_FILE_HANDLE + '.encoding', 'utf-8'),
+                          _parse_bool(get(_ROTATING_FILE_HANDLE + '.delay', 'False')))
+        self._add_handler(get, _TIME_ROTATING_FILE_HANDLE, 'False', logging.handlers.TimedRotatingFileHandler,
+                          get(_TIME_ROTATING_FILE_HANDLE + '.filename', timed_rotating_filename),
+                          get(_TIME_ROTATING_FILE_HANDLE + '.when', 'h'),
+                          int(get(_TIME_ROTATING_FILE_HANDLE + '.interval', 1)),
+                          int(get(_TIME_ROTATING_FILE_HANDLE + '.backupCount', 0)),
+                          get(_TIME_ROTATING_FILE_HANDLE + '.encoding', 'utf-8'),
+                          _parse_bool(get(_TIME_ROTATING_FILE_HANDLE + '.delay', 'False')),
+                          _parse_bool(get(_TIME_ROTATING_FILE_HANDLE + '.utc', 'False')),
+                          get(_TIME_ROTATING_FILE_HANDLE + '.atTime'))
+        self.queue = None
+        if _parse_bool(get(_QUEUE_HANDLE + '.open', 'False')):
+            self.queue = {
+                'max_size': int(get(_QUEUE_HANDLE + '.maxSize', 10000)),
+                'policy': get(_QUEUE_HANDLE + '.policy', 'block'),
+                'batch_size': int(get(_QUEUE_HANDLE + '.batchSize', 512)),
+                'flush_interval': float(get(_QUEUE_HANDLE + '.flushInterval', 1)),
+            }
+        self.flight_recorder = None
+        if _parse_bool(get(_FLIGHT_RECORDER_HANDLE + '.open', 'False')):
+            self.flight_recorder = {
+                'threshold': self.level,
+                'capacity': int(get(_FLIGHT_RECORDER_HANDLE + '.capacity', 1000)),
+                'scope': get(_FLIGHT_RECORDER_HANDLE + '.scope', 'thread'),
+                'dump_level': _parse_level(get(_FLIGHT_RECORDER_HANDLE + '.dumpLevel', 'ERROR')),
+            }
+            # 日志对象级别降至飞行记录器的记录级别, 低于 logging.level 的日志仅进入内存缓冲区
+            self.level = min(self.level, _parse_level(get(_FLIGHT_RECORDER_HANDLE + '.level', 'DEBUG')))
+        self.aggregator = None
+        if _parse_bool(get(_AGGREGATOR_HANDLE + '.open', 'False')):
+            self.aggregator = (get(_AGGREGATOR_HANDLE + '.address'), get(_AGGREGATOR_HANDLE + '.authkey'))
+
+    def _add_handler(self, get, path, default_state, handler_type, *args):
+        if _parse_bool(get(path + '.open', default_state)):
+            self.handlers.append(_HandlerConfig(handler_type, args, _parse_level(get(path + '.level', 'INFO')),
+                                                get(path + '.format', _DEFAULT_FORMAT)))
+
+    @staticmethod
+    def from_env():
+        return _LoggerConfig(_get_env, './global.log', './rotating.log')
+
+    @staticmethod
+    def from_properties(properties: dict):
+        return _LoggerConfig(lambda key, default=None: _get_properties(properties, key, default),
+                             './custom.log', './timed-rotating.log')
+
+
+def _log_handle_queue(log_: logging.Logger, *args, **kwargs):
+    """
+    将已配置的handler统一转移至异步队列handler, 由后台线程批量写入
+    """
+    handlers = list(log_.handlers)
+    if not handlers:
+        return
+    for handle in handlers:
+        log_.removeHandler(handle)
+    log_.addHandler(BatchQueueHandler(handlers, *args, **kwargs))
+
+
+def _log_handle_flight_recorder(log_: logging.Logger, *args, **kwargs):
+    """
+    将已配置的handler统一转移至飞行记录器handler, 低级别日志仅保存在内存中, 出错时再写入
+    """
+    handlers = list(log_.handlers)
+    if not handlers:
+        return
+    for handle in handlers:
+        log_.removeHandler(handle)
+    log_.addHandler(FlightRecorderHandler(handlers, *args, **kwargs))
+
+
+def dump_flight_recorder(log_: logging.Logger = None, timeout=None):
+    """
+    将日志对象(默认为全局日志)的飞行记录器缓冲区中的日志立即写入目标handler
+    :param timeout: 开启异步队列时等待队列中已有日志写入的超时时间, 单位: s, None 表示一直等待
+    """
+    log_ = log_ or get_logger()
+    if isinstance(log_, _DelayedConfigurationLogger):
+        handlers = log_.handlers_()
+    else:
+        handlers = log_.handlers
+    for handler in handlers:
+        if isinstance(handler, FlightRecorderHandler):
+            handler.dump()
+        elif isinstance(handler, BatchQueueHandler) and \
+                any(isinstance(h, FlightRecorderHandler) for h in handler.handlers):
+            # 经队列转发, 使写入顺序排在已入队的日志之后
+            request = _DumpRequest()
+            handler.handle(request)
+            request.done.wait(timeout)
+
+
+def _log_handle_aggregator(log_: logging.Logger, properties: dict, address=None, authkey=None):
+    """
+    多进程聚合模式: 当前进程仅发送日志, 由唯一的聚合进程按原配置写入文件
+    """
+    # 仅开启聚合模式时导入(socket/multiprocessing.connection)
+    import multiprocessing
+    from .aggregator import connect_or_start, is_aggregator_process
+
+    if is_aggregator_process():
+        # 聚合进程内由 _aggregated_logger 配置实际写入的handler, 其他日志对象不连接聚合进程(避免日志被循环发送)
+        return
+    authkey = authkey.encode('utf-8') if authkey else bytes(multiprocessing.current_process().authkey)
+    log_.addHandler(connect_or_start(log_.name, address, authkey, _aggregated_logger, log_.name, properties))
+
+
+def _aggregated_logger(name, properties: dict = None):
+    """
+    聚合进程内按原配置(环境变量或properties)创建实际写入的日志对象
+    """
+    _DelayedConfigurationLogger(name, properties=properties, aggregator_enable=False).init_config()
+    return logging.getLogger(name)
 
 
 def _delay_config(func):
@@ -65,11 +243,19 @@ class _DelayedConfigurationLogger(Logger):
     延迟初始化配置的日志对象, 仅用于当前全局日志对象的延迟装载
     """
 
-    def __init__(self, name: str, level=logging.INFO, properties=None):
+    def __init__(self, name: str, level=logging.INFO, properties=None, aggregator_enable=True):
         super().__init__("_DelayedConfigurationLogger." + name, level)
         self.__delegate = logging.getLogger(name)
         self.__init = False
         self.__properties = properties
+        self.__aggregator_enable = aggregator_enable
+        self.__lock = threading.RLock()
+        if aggregator_enable:
+            get = _get_env if not properties else lambda key, default=None: _get_properties(properties, key, default)
+            if _parse_bool(get(_AGGREGATOR_HANDLE + '.open', 'False')):
+                # 开启多进程聚合时立即初始化(启动或连接聚合进程), 使之后 fork 出的子进程(如 gunicorn worker)继承聚合进程地址,
+                # 而非各自在首次输出日志时启动聚合进程
+                self.init_config()
 
     @_delay_config
     def setLevel(self, level):
@@ -187,74 +373,29 @@ class _DelayedConfigurationLogger(Logger):
 
     def init_config(self):
         """
-        从环境变量中初始化日志配置
+        从环境变量(或properties)中初始化日志配置, 完成后将日志方法直接绑定至实际日志对象, 后续调用不再经过延迟初始化检查
         """
-        if not self.__init:
+        if self.__init:
+            return
+        with self.__lock:
+            if self.__init:
+                return
             if not self.__properties:
-                self.__delegate.setLevel(eval('logging.' + _get_env('logging.level', 'INFO').upper()))
-                _log_handle_env(self.__delegate, _STREAM_HANDLE, 'True')
-                _log_handle_env(self.__delegate, _FILE_HANDLE, 'False', logging.FileHandler,
-                                _get_env(_FILE_HANDLE + '.filename', './global.log'),
-                                _get_env(_FILE_HANDLE + '.mode', 'a'),
-                                _get_env(_FILE_HANDLE + '.encoding', 'utf-8'),
-                                eval(_get_env(_FILE_HANDLE + '.delay', 'False')))
-                _log_handle_env(self.__delegate, _ROTATING_FILE_HANDLE, 'False', logging.handlers.RotatingFileHandler,
-                                _get_env(_ROTATING_FILE_HANDLE + '.filename', './rotating.log'),
-                                _get_env(_ROTATING_FILE_HANDLE + '.mode', 'a'),
-                                int(_get_env(_ROTATING_FILE_HANDLE + '.maxBytes', 0)),
-                                int(_get_env(_ROTATING_FILE_HANDLE + '.backupCount', 0)),
-                                _get_env(_ROTATING_FILE_HANDLE + '.encoding', 'utf-8'),
-                                eval(_get_env(_ROTATING_FILE_HANDLE + '.delay', 'False')))
-                _log_handle_env(self.__delegate, _TIME_ROTATING_FILE_HANDLE, 'False',
-                                logging.handlers.TimedRotatingFileHandler,
-                                _get_env(_TIME_ROTATING_FILE_HANDLE + '.filename', './rotating.log'),
-                                _get_env(_TIME_ROTATING_FILE_HANDLE + '.when', 'h'),
-                                int(_get_env(_TIME_ROTATING_FILE_HANDLE + '.interval', 1)),
-                                int(_get_env(_TIME_ROTATING_FILE_HANDLE + '.backupCount', 0)),
-                                _get_env(_TIME_ROTATING_FILE_HANDLE + '.encoding', 'utf-8'),
-                                eval(_get_env(_TIME_ROTATING_FILE_HANDLE + '.delay', 'False')),
-                                eval(_get_env(_TIME_ROTATING_FILE_HANDLE + '.utc', 'False')),
-                                _get_env(_TIME_ROTATING_FILE_HANDLE + '.atTime')
-                                )
+                config = _LoggerConfig.from_env()
+            else:
+                config = _LoggerConfig.from_properties(self.__properties)
+            self.__delegate.setLevel(config.level)
+            if self.__aggregator_enable and config.aggregator is not None:
+                _log_handle_aggregator(self.__delegate, self.__properties, *config.aggregator)
             else:
-                self.__delegate.setLevel(
-                    eval('logging.' + _get_properties(self.__properties, 'logging.level', 'INFO').upper()))
-                _log_handle_properties(self.__delegate, self.__properties, _STREAM_HANDLE, 'True')
-                _log_handle_properties(self.__delegate, self.__properties, _FILE_HANDLE, 'False',
-                                       logging.FileHandler,
-                                       _get_properties(self.__properties, _FILE_HANDLE + '.filename',
-                                                       './custom.log'),
-                                       _get_properties(self.__properties, _FILE_HANDLE + '.mode', 'a'),
-                                       _get_properties(self.__properties, _FILE_HANDLE + '.encoding', 'utf-8'),
-                                       eval(_get_properties(self.__properties, _FILE_HANDLE + '.delay', 'False')))
-                _log_handle_properties(self.__delegate, self.__properties, _ROTATING_FILE_HANDLE, 'False',
-                                       logging.handlers.RotatingFileHandler,
-                                       _get_properties(self.__properties, _ROTATING_FILE_HANDLE + '.filename',
-                                                       './rotating.log'),
-                                       _get_properties(self.__properties, _ROTATING_FILE_HANDLE + '.mode', 'a'),
-                                       int(_get_properties(self.__properties, _ROTATING_FILE_HANDLE + '.maxBytes', 0)),
-                                       int(_get_properties(self.__properties, _ROTATING_FILE_HANDLE + 'backupCount',
-                                                           0)),
-                                       _get_properties(self.__properties, _ROTATING_FILE_HANDLE + '.encoding', 'utf-8'),
-                                       eval(_get_properties(self.__properties, _ROTATING_FILE_HANDLE + '.delay',
-                                                            'False')))
-                _log_handle_properties(self.__delegate, self.__properties, _TIME_ROTATING_FILE_HANDLE, 'False',
-                                       logging.handlers.TimedRotatingFileHandler,
-                                       _get_properties(self.__properties, _TIME_ROTATING_FILE_HANDLE + '.filename',
-                                                       './timed-rotating.log'),
-                                       _get_properties(self.__properties, _TIME_ROTATING_FILE_HANDLE + '.when', 'h'),
-                                       int(_get_properties(self.__properties, _TIME_ROTATING_FILE_HANDLE + '.interval',
-                                                           1)),
-                                       int(_get_properties(self.__properties,
-                                                           _TIME_ROTATING_FILE_HANDLE + '.backupCount', 0)),
-                                       _get_properties(self.__properties, _TIME_ROTATING_FILE_HANDLE + '.encoding',
-                                                       'utf-8'),
-                                       eval(_get_properties(self.__properties, _TIME_ROTATING_FILE_HANDLE + '.delay',
-                                                            'False')),
-                                       eval(_get_properties(self.__properties, _TIME_ROTATING_FILE_HANDLE + '.utc',
-                                                            'False')),
-                                       _get_properties(self.__properties, _TIME_ROTATING_FILE_HANDLE + '.atTime')
-                                       )
+                for handler_config in config.handlers:
+                    self.__delegate.addHandler(handler_config.create())
+                if config.flight_recorder is not None:
+                    _log_handle_flight_recorder(self.__delegate, **config.flight_recorder)
+                if config.queue is not None:
+                    _log_handle_queue(self.__delegate, **config.queue)
+            for name in _DELEGATE_METHODS:
+                setattr(self, name, getattr(self.__delegate, name))
             self.__init = True
 
 
@@ -0,0 +1 @@
+from .stream import Pipeline, Stage, stage
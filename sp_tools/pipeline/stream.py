@@ -0,0 +1,383 @@
+import inspect
+import queue
+import threading
+import time
+from concurrent.futures import Executor
+
+from ..logger import get_logger
+from ..annotation.common import annotation, extended_annotation
+from ..annotation.process import MODE_THREAD, MODE_PROCESS, DEFAULT_SHARED_MEMORY_THRESHOLD, get_process_pool
+from ..annotation.process import register as register_process_target, submit as submit_process, call_by_name
+
+__log = get_logger()
+
+ERRORS_RAISE = 'raise'
+ERRORS_SKIP = 'skip'
+_ERRORS = (ERRORS_RAISE, ERRORS_SKIP)
+
+DEFAULT_QUEUE_SIZE = 64
+
+# 流结束标记, 沿队列向下游传递
+_END = object()
+# 队列满/空时检查流水线是否已停止的间隔, 单位: s
+_POLL_INTERVAL = 0.1
+
+
+def _log_skipped(name, e):
+    __log.warning('[pipeline] stage %s skipped an item: %r', name, e)
+
+
+def _expand_by_name(module, qualname, item):
+    """
+    子进程执行入口: 生成器方法的结果无法pickle, 在子进程中展开为列表返回
+    """
+    return list(call_by_name(module, qualname, (item,), {}))
+
+
+class Stage:
+    """
+    流水线阶段: 以 workers 个工作线程(或 workers 个进程池并发任务)逐条处理输入队列中的数据, 结果写入下一阶段的输入队列
+    """
+
+    def __init__(self, func, workers=1, mode=MODE_THREAD, queue_size=None, errors=ERRORS_RAISE, name=None,
+                 pool=None, shared_memory_threshold=DEFAULT_SHARED_MEMORY_THRESHOLD):
+        """
+        :param func: 处理方法 func(item) -> 结果; 生成器方法的每个产出值均作为一条结果(一对多), 返回值不参与传递
+        :param workers: 并发数(工作线程数, 进程模式下为同时进行中的进程池任务数)
+        :param mode: 运行模式, thread: 工作线程中执行, process: 进程池中执行(仅支持模块级方法, 见 @parallel(mode='process'))
+        :param queue_size: 输入队列长度, 为None时使用流水线的 queue_size
+        :param errors: 单条数据处理异常时的处理方式, raise: 停止流水线并由结果迭代器抛出该异常, skip: 丢弃该条数据并计数
+        :param name: 阶段名称, 默认为方法限定名
+        :param pool: 进程模式下执行的 ProcessPoolExecutor, 不传时使用进程内共享的进程池
+        :param shared_memory_threshold: 进程模式下, 大于该字节数的参数通过共享内存传递, None 表示不使用共享内存
+        """
+        if mode not in (MODE_THREAD, MODE_PROCESS):
+            raise ValueError(f'unsupported stage mode: {mode}')
+        if errors not in _ERRORS:
+            raise ValueError(f'unsupported stage errors: {errors}, available: {_ERRORS}')
+        if inspect.iscoroutinefunction(func):
+            raise ValueError(f'coroutine function is not supported as a pipeline stage: {func.__qualname__}')
+        if mode == MODE_PROCESS:
+            if pool is not None and not isinstance(pool, Executor):
+                raise ValueError('stage process mode only supports an Executor pool')
+            register_process_target(func)
+        self.func = func
+        self.workers = max(1, workers)
+        self.mode = mode
+        self.queue_size = queue_size
+        self.errors = errors
+        self.name = name or getattr(func, '__qualname__', 'stage')
+        self.pool = pool
+        self.shared_memory_threshold = shared_memory_threshold
+        self.generator = inspect.isgeneratorfunction(func)
+
+    def caller(self):
+        """
+        返回处理单条数据的方法 call(item) -> 结果列表
+        """
+        func = self.func
+        if self.mode == MODE_THREAD:
+            if self.generator:
+                return lambda item: list(func(item))
+            return lambda item: (func(item),)
+        executor = self.pool or get_process_pool()
+        if self.generator:
+            return lambda item: executor.submit(_expand_by_name, func.__module__, func.__qualname__, item).result()
+        threshold = self.shared_memory_threshold
+        return lambda item: (submit_process(executor, func, (item,), {}, threshold).result(),)
+
+
+@annotation
+@extended_annotation
+def stage(ignore=False, workers=1, mode=MODE_THREAD, queue_size=None, errors=ERRORS_RAISE, name=None, pool=None):
+    """
+    流水线阶段声明注解, 声明方法在流水线(Pipeline)中的并发方式, 不改变方法本身的调用, 使用方式:
+        @stage(workers=4)
+        @retry(retry_times=3)
+        def fetch(url):
+            return requests.get(url).text
+
+        for page in Pipeline(urls, fetch):
+            pass
+    方法上的 @retry/@log 等注解对每条数据分别生效
+    :param ignore: 是否忽略该注解(忽略时以单个工作线程处理)
+    :param workers: 并发数, 见 Stage
+    :param mode: 运行模式 thread/process, 见 Stage
+    :param queue_size: 输入队列长度, 见 Stage
+    :param errors: 单条数据处理异常时的处理方式 raise/skip, 见 Stage
+    :param name: 阶段名称, 默认为方法限定名
+    :param pool: 进程模式下执行的 ProcessPoolExecutor
+    :return 原方法, 新增 pipeline_stage 属性
+    """
+
+    def wrapper(func):
+        if ignore:
+            func.pipeline_stage = Stage(func, queue_size=queue_size, errors=errors, name=name)
+        else:
+            func.pipeline_stage = Stage(func, workers, mode, queue_size, errors, name, pool)
+        return func
+
+    return wrapper
+
+
+class _StageRunner:
+    """
+    阶段运行状态: 工作线程、输入/输出队列及计数
+    """
+
+    def __init__(self, pipeline, stage_, input_, output):
+        self.pipeline = pipeline
+        self.stage = stage_
+        self.input = input_
+        self.output = output
+        self.threads = []
+        self.remaining = stage_.workers
+        self.lock = threading.Lock()
+        self.counters = {'in': 0, 'out': 0, 'errors': 0, 'busy': 0.0}
+
+    def start(self):
+        for i in range(self.stage.workers):
+            t = threading.Thread(target=self.__work, name=f'sp_tools-pipeline-{self.stage.name}-{i}', daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def stats(self, elapsed) -> dict:
+        with self.lock:
+            stats = dict(self.counters)
+        stats.update(name=self.stage.name, mode=self.stage.mode, workers=self.stage.workers,
+                     queue_depth=self.input.qsize(), queue_size=self.input.maxsize,
+                     max_queue_depth=self.input.max_depth,
+                     throughput=stats['out'] / elapsed if elapsed > 0 else 0.0)
+        return stats
+
+    def __work(self):
+        pipeline = self.pipeline
+        stage_ = self.stage
+        call = stage_.caller()
+        counters = self.counters
+        lock = self.lock
+        while True:
+            item = pipeline.get(self.input)
+            if item is _END:
+                if pipeline.stopped:
+                    return
+                break
+            start = time.perf_counter()
+            try:
+                results = call(item)
+            except Exception as e:
+                with lock:
+                    counters['in'] += 1
+                    counters['errors'] += 1
+                    counters['busy'] += time.perf_counter() - start
+                if stage_.errors == ERRORS_RAISE:
+                    pipeline.fail(e)
+                    return
+                _log_skipped(stage_.name, e)
+                continue
+            with lock:
+                counters['in'] += 1
+                counters['out'] += len(results)
+                counters['busy'] += time.perf_counter() - start
+            for result in results:
+                if not pipeline.put(self.output, result):
+                    return
+            del item, results
+        # 结束标记放回输入队列供同阶段其他工作线程读取, 最后退出的工作线程向下游传递
+        with lock:
+            self.remaining -= 1
+            last = self.remaining == 0
+        if last:
+            pipeline.put(self.output, _END)
+        else:
+            self.input.put(_END)
+
+
+class _Queue(queue.Queue):
+    """
+    记录最大深度的有界队列
+    """
+
+    def __init__(self, maxsize):
+        super().__init__(maxsize)
+        self.max_depth = 0
+
+    def _put(self, item):
+        super()._put(item)
+        if len(self.queue) > self.max_depth:
+            self.max_depth = len(self.queue)
+
+
+class Pipeline:
+    """
+    流式处理流水线: 输入逐条流经各阶段, 阶段之间以有界队列连接, 下游处理慢时上游阻塞(背压), 内存占用与输入大小无关.
+    各阶段多个工作线程并发时, 结果不保证按输入顺序输出(单个工作线程的阶段保持顺序)
+    使用方式:
+        for record in Pipeline(open('big.log'), parse).then(enrich, workers=8).then(score, mode='process', workers=4):
+            save(record)
+    """
+
+    def __init__(self, source, *stages, queue_size=DEFAULT_QUEUE_SIZE, name=None):
+        """
+        :param source: 输入, 任意可迭代对象(包括生成器), 由后台线程逐条读取
+        :param stages: 阶段, 支持 Stage 对象、@stage 声明的方法或普通方法(单个工作线程)
+        :param queue_size: 阶段间队列的默认长度
+        :param name: 流水线名称(后台线程名)
+        """
+        self.source = source
+        self.queue_size = queue_size
+        self.name = name or 'pipeline'
+        self.__stages = []
+        self.__runners = []
+        self.__stop = threading.Event()
+        self.__error = None
+        self.__lock = threading.Lock()
+        self.__started = False
+        self.__feeder = None
+        self.__start_time = None
+        self.__end_time = None
+        self.__counters = {'source': 0, 'output': 0}
+        for s in stages:
+            self.then(s)
+
+    def then(self, func, **kwargs) -> 'Pipeline':
+        """
+        追加阶段, 返回流水线本身
+        :param func: Stage 对象、@stage 声明的方法或普通方法
+        :param kwargs: 阶段参数(见 Stage), 传入时覆盖 @stage 声明
+        """
+        if self.__started:
+            raise RuntimeError(f'pipeline {self.name} already started')
+        if isinstance(func, Stage):
+            stage_ = func
+        elif kwargs or getattr(func, 'pipeline_stage', None) is None:
+            stage_ = Stage(func, **kwargs)
+        else:
+            stage_ = func.pipeline_stage
+        self.__stages.append(stage_)
+        return self
+
+    def __iter__(self):
+        return self.run()
+
+    def run(self):
+        """
+        启动流水线, 返回结果生成器(仅可调用一次); 提前结束迭代时停止流水线, 任一阶段以 raise 方式出错时抛出该异常
+        """
+        self.__start()
+        output = self.__runners[-1].output if self.__runners else self.__input
+        counters = self.__counters
+        try:
+            while True:
+                item = self.get(output)
+                if item is _END:
+                    break
+                counters['output'] += 1
+                yield item
+            if self.__error is not None:
+                raise self.__error
+        finally:
+            self.close()
+
+    def close(self, wait=True):
+        """
+        停止流水线, 未处理的数据被丢弃
+        :param wait: 是否等待工作线程退出(正在处理的数据处理完成后退出)
+        """
+        self.__stop.set()
+        if self.__end_time is None:
+            self.__end_time = time.monotonic()
+        if wait:
+            threads = [t for r in self.__runners for t in r.threads]
+            if self.__feeder is not None:
+                threads.append(self.__feeder)
+            current = threading.current_thread()
+            for t in threads:
+                if t is not current:
+                    t.join()
+
+    def stats(self) -> dict:
+        """
+        运行统计: source: 已读取输入数, output: 已输出结果数, elapsed: 运行时间(s), stages: 各阶段统计列表,
+        每个阶段 in/out/errors: 处理/产出/出错数据数, busy: 处理耗时累计(s), throughput: 每秒产出数,
+        queue_depth/max_queue_depth/queue_size: 输入队列当前/最大深度及长度
+        """
+        if self.__start_time is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self.__end_time or time.monotonic()) - self.__start_time
+        stats = dict(self.__counters, name=self.name, elapsed=elapsed)
+        stats['stages'] = [r.stats(elapsed) for r in self.__runners]
+        return stats
+
+    @property
+    def stopped(self) -> bool:
+        return self.__stop.is_set()
+
+    def put(self, q, item) -> bool:
+        """
+        写入队列, 队列满时阻塞, 流水线停止时返回False
+        """
+        stop = self.__stop
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(self, q):
+        """
+        读取队列, 队列空时阻塞, 流水线停止时返回结束标记
+        """
+        stop = self.__stop
+        while not stop.is_set():
+            try:
+                return q.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                pass
+        return _END
+
+    def fail(self, e):
+        """
+        记录第一个异常并停止流水线
+        """
+        with self.__lock:
+            if self.__error is None:
+                self.__error = e
+        self.__stop.set()
+
+    def __start(self):
+        with self.__lock:
+            if self.__started:
+                raise RuntimeError(f'pipeline {self.name} already started')
+            self.__started = True
+        self.__start_time = time.monotonic()
+        self.__input = _Queue(self.__stages[0].queue_size or self.queue_size) if self.__stages \
+            else _Queue(self.queue_size)
+        input_ = self.__input
+        for i, stage_ in enumerate(self.__stages):
+            if i + 1 < len(self.__stages):
+                output = _Queue(self.__stages[i + 1].queue_size or self.queue_size)
+            else:
+                output = _Queue(self.queue_size)
+            self.__runners.append(_StageRunner(self, stage_, input_, output))
+            input_ = output
+        for runner in self.__runners:
+            runner.start()
+        self.__feeder = threading.Thread(target=self.__feed, name=f'sp_tools-pipeline-{self.name}-source',
+                                         daemon=True)
+        self.__feeder.start()
+
+    def __feed(self):
+        counters = self.__counters
+        try:
+            for item in self.source:
+                if not self.put(self.__input, item):
+                    return
+                counters['source'] += 1
+        except Exception as e:
+            self.fail(e)
+            return
+        self.put(self.__input, _END)
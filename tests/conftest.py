@@ -0,0 +1,40 @@
+import os
+import sys
+import time
+import traceback
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def run_in_fork():
+    """
+    在 fork 出的子进程中执行方法, 返回子进程退出码(0: 执行成功, 1: 出现异常, None: 超时未退出)
+    """
+    if not hasattr(os, 'fork'):
+        pytest.skip('os.fork is not available')
+
+    def run(target, timeout=10):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                target()
+                code = 0
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                os._exit(code)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            done, status = os.waitpid(pid, os.WNOHANG)
+            if done:
+                return os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+            time.sleep(0.01)
+        os.kill(pid, 9)
+        os.waitpid(pid, 0)
+        return None
+
+    return run
@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = textwrap.dedent('''
+    import multiprocessing
+    import os
+    import sys
+
+    if __name__ == '__main__':
+        multiprocessing.set_start_method(sys.argv[1])
+        os.environ['logging.aggregator.open'] = 'True'
+        os.environ['logging.streamHandler.open'] = 'False'
+        os.environ['logging.fileHandler.open'] = 'True'
+        os.environ['logging.fileHandler.filename'] = sys.argv[2]
+        from sp_tools.logger import get_logger
+        for i in range(3):
+            get_logger().info('line %d', i)
+''')
+
+
+def _run(tmp_path, method):
+    script = tmp_path / 'aggregate.py'
+    script.write_text(SCRIPT)
+    log_file = tmp_path / 'out.log'
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    for key in list(env):
+        if key.startswith('logging.') or key.startswith('sp_tools.logging.'):
+            del env[key]
+    result = subprocess.run([sys.executable, str(script), method, str(log_file)], env=env, cwd=str(tmp_path),
+                            capture_output=True, text=True, timeout=60)
+    return result, log_file.read_text().splitlines()
+
+
+def test_spawned_aggregator_does_not_send_to_itself(tmp_path):
+    result, lines = _run(tmp_path, 'spawn')
+    assert result.returncode == 0, result.stderr
+    assert 'Logging error' not in result.stderr
+    assert [line.rsplit(' - ', 1)[1] for line in lines] == ['line 0', 'line 1', 'line 2']
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='fork is not available')
+def test_forked_aggregator(tmp_path):
+    result, lines = _run(tmp_path, 'fork')
+    assert result.returncode == 0, result.stderr
+    assert [line.rsplit(' - ', 1)[1] for line in lines] == ['line 0', 'line 1', 'line 2']
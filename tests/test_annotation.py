@@ -0,0 +1,42 @@
+import asyncio
+
+from sp_tools.annotation import log, retry, timed
+
+
+class Account:
+    @classmethod
+    @log
+    def describe(self, x):
+        return self, x
+
+    @classmethod
+    @retry
+    async def describe_async(self, x):
+        return self, x
+
+    @timed
+    def method(self, x):
+        return x
+
+
+def pair(a, b):
+    return a, b
+
+
+def test_module_function_is_not_wrapped_again():
+    decorated = log(pair)
+    assert decorated.__wrapped__ is pair
+    # 模块级方法不去除参数
+    account = Account()
+    assert decorated(Account, account) == (Account, account)
+
+
+def test_classmethod_call_with_instance():
+    account = Account()
+    assert Account.describe(account, 1) == (account, 1)
+    assert asyncio.run(Account.describe_async(account, 2)) == (account, 2)
+
+
+def test_method_keeps_annotation_attributes():
+    assert Account().method(3) == 3
+    assert Account.method.timed_stats()['calls'] == 1
@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+import pytest
+
+from sp_tools.annotation import circuit_breaker
+from sp_tools.annotation.circuit import STATE_CLOSED, STATE_HALF_OPEN
+
+
+class Interrupted(BaseException):
+    pass
+
+
+def _breaker_options():
+    return dict(minimum_calls=1, failure_threshold=0.5, recovery_timeout=0.05, half_open_calls=1, log_=None)
+
+
+def test_interrupted_half_open_probe_returns_permit():
+    outcomes = [ValueError('down'), Interrupted(), None]
+
+    @circuit_breaker(**_breaker_options())
+    def call():
+        outcome = outcomes.pop(0)
+        if outcome is not None:
+            raise outcome
+        return 'ok'
+
+    with pytest.raises(ValueError):
+        call()
+    time.sleep(0.06)
+    with pytest.raises(Interrupted):
+        call()
+    breaker = call.circuit_breakers[None]
+    assert breaker.state is STATE_HALF_OPEN
+    assert call() == 'ok'
+    assert breaker.state is STATE_CLOSED
+
+
+def test_cancelled_async_half_open_probe_returns_permit():
+    fail = [True]
+
+    @circuit_breaker(**_breaker_options())
+    async def call(delay):
+        if fail:
+            fail.pop()
+            raise ValueError('down')
+        await asyncio.sleep(delay)
+        return 'ok'
+
+    async def main():
+        with pytest.raises(ValueError):
+            await call(0)
+        await asyncio.sleep(0.06)
+        probe = asyncio.ensure_future(call(10))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        return await call(0)
+
+    assert asyncio.run(main()) == 'ok'
+    assert call.circuit_breakers[None].state is STATE_CLOSED
@@ -0,0 +1,72 @@
+import contextlib
+import threading
+
+from sp_tools.annotation import get_pool, get_timer, profile, configure_profile, get_profile_stats
+from sp_tools.annotation import pool as pool_module, _profile, _timed
+
+
+@contextlib.contextmanager
+def held_by_other_thread(lock):
+    """
+    在其他线程中持有锁(fork 时该线程不会进入子进程, 锁在子进程中不会被释放)
+    """
+    acquired, release = threading.Event(), threading.Event()
+
+    def hold():
+        with lock:
+            acquired.set()
+            release.wait()
+
+    t = threading.Thread(target=hold, daemon=True)
+    t.start()
+    acquired.wait()
+    try:
+        yield
+    finally:
+        release.set()
+        t.join()
+
+
+def test_timer_after_fork(run_in_fork):
+    timer = get_timer('test_fork.timer')
+    timer.record(1000)
+
+    def child():
+        result = []
+        t = threading.Thread(target=lambda: result.append(timer.record(2000)))
+        t.start()
+        t.join()
+        assert timer.snapshot()['calls'] == 2
+        get_timer('test_fork.timer.child').record(1)
+
+    with held_by_other_thread(timer._Timer__lock), held_by_other_thread(_timed._timers_lock):
+        assert run_in_fork(child) == 0
+
+
+def test_profile_after_fork(run_in_fork):
+    @profile(every=1)
+    def profiled():
+        return sum(range(100))
+
+    def child():
+        configure_profile({'profile': {'open': 'True'}})
+        profiled()
+        assert get_profile_stats()[profiled.__qualname__]['profiled'] == 1
+
+    with held_by_other_thread(_profile._profiling):
+        assert run_in_fork(child) == 0
+
+
+def test_pool_after_fork_in_worker(run_in_fork):
+    pool = get_pool('test_fork')
+
+    def child():
+        assert getattr(pool_module._worker, 'pool', None) is None
+        # 子进程中重新创建工作线程执行任务
+        assert pool.submit(threading.current_thread).result(5) is not threading.current_thread()
+
+    def fork_in_worker():
+        with held_by_other_thread(pool_module._pools_lock):
+            return run_in_fork(child)
+
+    assert pool.submit(fork_in_worker).result(30) == 0
@@ -0,0 +1,28 @@
+import threading
+import time
+
+from sp_tools.annotation import hedge, parallel
+
+
+def test_hedge_inside_parallel_task():
+    calls = []
+    lock = threading.Lock()
+
+    @hedge(delay_ms=50, max_extra_ratio=1)
+    def slow_first(x):
+        with lock:
+            calls.append(x)
+            first = len(calls) == 1
+        time.sleep(1 if first else 0.01)
+        return x
+
+    @parallel
+    def outer(x):
+        start = time.monotonic()
+        return slow_first(x), time.monotonic() - start
+
+    result, elapsed = outer(1).get(5)
+    assert result == 1
+    assert elapsed < 0.5
+    assert slow_first.hedge_stats()['hedges'] == 1
+    assert slow_first.hedge_stats()['hedge_wins'] == 1
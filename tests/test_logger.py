@@ -0,0 +1,102 @@
+import logging
+
+from sp_tools.annotation import log
+from sp_tools.logger.handlers import FlightRecorderHandler
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def _recorded_logger(name):
+    target = _ListHandler()
+    logger = logging.getLogger(name)
+    logger.handlers = [FlightRecorderHandler([target], threshold=logging.WARNING)]
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    return logger, logger.handlers[0], target
+
+
+def test_flight_recorder_keeps_log_message_lazy():
+    logger, recorder, target = _recorded_logger('test_logger.lazy')
+
+    @log(log_=logger, level_=logging.DEBUG, format='{method_} {args_} {return_}')
+    def append(items, x):
+        items.append(x)
+        return items
+
+    items = []
+    append(items, 1)
+    buffered = list(recorder._FlightRecorderHandler__buffers.values())[0].records[0]
+    # 缓冲时不格式化消息, 仅渲染可变参数
+    assert not isinstance(buffered.msg, str)
+    items.append(2)
+    recorder.dump()
+    assert target.records[0].getMessage().endswith('append ([1], 1) [1]')
+
+
+def test_flight_recorder_snapshots_mutable_args():
+    logger, recorder, target = _recorded_logger('test_logger.args')
+    values = {'a': 1}
+    logger.debug('%s %s', values, 'x')
+    logger.debug('%s %s', 1, ('x', 2))
+    values['b'] = 2
+    recorder.dump()
+    assert [r.getMessage() for r in target.records] == ["{'a': 1} x", "1 ('x', 2)"]
+    assert target.records[1].args == (1, ('x', 2))
+
+
+class _Counted:
+    def __init__(self):
+        self.reprs = 0
+
+    def __repr__(self):
+        self.reprs += 1
+        return 'Counted'
+
+
+def _plain_logger(name, level):
+    target = _ListHandler()
+    logger = logging.getLogger(name)
+    logger.handlers = [target]
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger, target
+
+
+def test_log_skips_formatting_when_level_disabled():
+    logger, target = _plain_logger('test_logger.disabled', logging.WARNING)
+    value = _Counted()
+
+    @log(log_=logger, level_=logging.INFO, err_level=logging.INFO)
+    def f(x, fail=False):
+        if fail:
+            raise ValueError('fail')
+        return x
+
+    f(value)
+    try:
+        f(value, fail=True)
+    except ValueError:
+        pass
+    assert not target.records
+    assert value.reprs == 0
+
+
+def test_log_bounds_argument_repr():
+    logger, target = _plain_logger('test_logger.bounded', logging.DEBUG)
+
+    @log(log_=logger, format='{args_} {return_}', repr_max_chars=20, repr_max_items=3)
+    def f(data, items):
+        return len(data)
+
+    f('x' * 10000, list(range(1000)))
+    message = target.records[0].getMessage()
+    assert len(message) < 200
+    assert 'x' * 21 not in message
+    assert '999' not in message
@@ -0,0 +1,45 @@
+import threading
+import time
+
+from sp_tools.annotation import BoundedThreadPool
+
+
+def test_nested_submit_runs_in_parallel():
+    pool = BoundedThreadPool(max_workers=4, name='test_nested_parallel')
+
+    def outer():
+        children = [pool.submit(lambda: (time.sleep(0.2), threading.current_thread())[1]) for _ in range(3)]
+        return [f.result(5) for f in children]
+
+    start = time.monotonic()
+    threads = pool.submit(outer).result(5)
+    assert time.monotonic() - start < 0.5
+    assert len(set(threads)) == 3
+    assert pool.metrics()['nested_runs'] == 0
+    pool.shutdown()
+
+
+def test_nested_submit_runs_inline_when_saturated():
+    pool = BoundedThreadPool(max_workers=1, name='test_nested_saturated')
+
+    def outer():
+        return pool.submit(threading.current_thread).result(5) is threading.current_thread()
+
+    assert pool.submit(outer).result(5)
+    assert pool.metrics()['nested_runs'] == 1
+    pool.shutdown()
+
+
+def test_nested_submit_does_not_deadlock():
+    pool = BoundedThreadPool(max_workers=2, name='test_nested_deadlock')
+
+    def leaf(x):
+        time.sleep(0.01)
+        return x
+
+    def outer(i):
+        return sum(f.result(5) for f in [pool.submit(leaf, i * 10 + j) for j in range(5)])
+
+    futures = [pool.submit(outer, i) for i in range(8)]
+    assert [f.result(10) for f in futures] == [sum(i * 10 + j for j in range(5)) for i in range(8)]
+    pool.shutdown()
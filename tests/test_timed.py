@@ -0,0 +1,65 @@
+import threading
+
+from sp_tools.annotation import get_timer, timed
+
+
+def test_exited_thread_histograms_are_merged():
+    timer = get_timer('test_timed.exited')
+
+    def record():
+        for ns in (1000, 2000, 4000):
+            timer.record(ns)
+
+    threads = [threading.Thread(target=record) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # 线程结束时已归并, 不再保留各线程的直方图
+    assert not timer._Timer__histograms
+    snapshot = timer.snapshot()
+    assert snapshot['calls'] == 24
+    assert snapshot['max'] == 0.004
+
+
+def test_exited_thread_merged_while_lock_held():
+    timer = get_timer('test_timed.locked')
+    timer.record(1000)
+    recorded, exit_ = threading.Event(), threading.Event()
+
+    def record():
+        timer.record(2000)
+        recorded.set()
+        exit_.wait()
+
+    t = threading.Thread(target=record)
+    t.start()
+    recorded.wait()
+    with timer._Timer__lock:
+        exit_.set()
+        t.join()
+    assert len(timer._Timer__histograms) == 2
+    assert timer.snapshot()['calls'] == 2
+    assert len(timer._Timer__histograms) == 1
+
+
+def test_timed_counts_calls_from_worker_threads():
+    @timed(name='test_timed.decorated')
+    def f(x):
+        if x < 0:
+            raise ValueError(x)
+        return x
+
+    threads = [threading.Thread(target=f, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert f(1) == 1
+    try:
+        f(-1)
+    except ValueError:
+        pass
+    snapshot = f.timed_stats()
+    assert snapshot['calls'] == 6
+    assert snapshot['errors'] == 1
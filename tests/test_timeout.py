@@ -0,0 +1,88 @@
+import asyncio
+import concurrent.futures
+import time
+
+import pytest
+
+from sp_tools.annotation import CallTimeoutError, current_token, parallel, retry, timeout
+
+
+def _slow():
+    token = current_token()
+    token.wait(2)
+    token.raise_if_cancelled()
+    return 'late'
+
+
+def _blocking():
+    # 不检查取消令牌, 只能由外层放弃
+    time.sleep(0.5)
+    return 'late'
+
+
+def test_call_timeout_error_is_every_timeout_error():
+    error = CallTimeoutError('x')
+    assert isinstance(error, TimeoutError)
+    assert isinstance(error, concurrent.futures.TimeoutError)
+    assert isinstance(error, asyncio.TimeoutError)
+
+
+def test_nested_timeout():
+    inner = timeout(seconds=0.1)(_blocking)
+
+    @timeout(seconds=5)
+    def outer():
+        start = time.monotonic()
+        with pytest.raises(CallTimeoutError):
+            inner()
+        return time.monotonic() - start
+
+    assert outer() < 0.4
+
+
+def test_nested_parallel_timeout():
+    inner = parallel(timeout=0.1)(_blocking)
+
+    @parallel
+    def outer():
+        start = time.monotonic()
+        with pytest.raises(CallTimeoutError):
+            inner().get()
+        return time.monotonic() - start
+
+    assert outer().get(5) < 0.4
+
+
+def test_async_timeout():
+    @timeout(seconds=0.1)
+    async def slow():
+        await asyncio.sleep(2)
+
+    with pytest.raises(CallTimeoutError):
+        asyncio.run(slow())
+    assert slow.timeout_stats() == {'calls': 1, 'timeouts': 1}
+
+
+def test_own_timeout_error_is_not_converted():
+    @timeout(seconds=5)
+    def fail():
+        raise TimeoutError('own')
+
+    with pytest.raises(TimeoutError) as info:
+        fail()
+    assert not isinstance(info.value, CallTimeoutError)
+    assert fail.timeout_stats()['timeouts'] == 0
+
+
+def test_retry_builtin_timeout_error():
+    attempts = []
+
+    @retry(retry_times=3, interval=0, ex=TimeoutError)
+    @timeout(seconds=0.1)
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            _slow()
+        return len(attempts)
+
+    assert flaky() == 3